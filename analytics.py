@@ -0,0 +1,202 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from statistics import median
+
+
+def _epoch(ts):
+    return datetime.fromisoformat(ts).timestamp()
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(timespec="seconds")
+
+
+class VisitColumns:
+    """Scans from a time window as parallel typed arrays, sorted by time.
+
+    ``ts`` holds epoch seconds, ``zone`` registry indexes and ``patrol``
+    positions in ``patrols`` (-1 for scans taken outside a patrol). Scans of
+    zones the registry does not know are dropped.
+    """
+
+    __slots__ = ("ts", "zone", "patrol", "patrols")
+
+    def __init__(self, records, registry):
+        ts, zone, patrol = array("d"), array("l"), array("l")
+        patrols, positions = [], {}
+        for rec in records:
+            z = registry.get(rec["zone_id"])
+            if z is None:
+                continue
+            ts.append(_epoch(rec["ts"]))
+            zone.append(z["index"])
+            session = rec.get("session")
+            if session:
+                i = positions.get(session)
+                if i is None:
+                    i = positions[session] = len(patrols)
+                    patrols.append(session)
+                patrol.append(i)
+            else:
+                patrol.append(-1)
+        # Segments are per worker and queued scans arrive late, so the log
+        # is only roughly in time order; sort once here.
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        self.ts = array("d", [ts[i] for i in order])
+        self.zone = array("l", [zone[i] for i in order])
+        self.patrol = array("l", [patrol[i] for i in order])
+        self.patrols = patrols
+
+    def __len__(self):
+        return len(self.ts)
+
+    def groups(self, column):
+        """Yield ``(key, positions)`` runs of ``column``, time-ordered within each run."""
+        # sorted() is stable, so positions stay in time order per key.
+        order = sorted(range(len(column)), key=column.__getitem__)
+        start = 0
+        for i in range(1, len(order) + 1):
+            if i == len(order) or column[order[i]] != column[order[start]]:
+                yield column[order[start]], order[start:i]
+                start = i
+
+
+def missed_zones(cols, registry, as_of, hours):
+    """Zones not scanned in the ``hours`` before ``as_of``, least recently seen first."""
+    last = array("d", bytes(8 * registry.total))
+    # Time-sorted, so the final write per zone is its latest scan.
+    for t, z in zip(cols.ts, cols.zone):
+        last[z] = t
+    cutoff = as_of - hours * 3600
+    missed = []
+    for i in sorted(range(len(last)), key=last.__getitem__):
+        t = last[i]
+        if t >= cutoff:
+            break
+        zone = registry.get(registry.order[i])
+        missed.append({
+            "id": zone["id"],
+            "floor": zone["floor"],
+            "location": zone["location"],
+            "last_visit": _iso(t) if t else None,
+            "hours_since": round((as_of - t) / 3600, 2) if t else None,
+        })
+    return missed
+
+
+def visit_intervals(cols, registry):
+    """Per-zone scan count and median gap between consecutive scans, in seconds."""
+    ts = cols.ts
+    out = []
+    for z, positions in cols.groups(cols.zone):
+        zone = registry.get(registry.order[z])
+        gaps = [ts[b] - ts[a] for a, b in zip(positions, positions[1:])]
+        out.append({
+            "id": zone["id"],
+            "floor": zone["floor"],
+            "visits": len(positions),
+            "median_interval_s": round(median(gaps), 1) if gaps else None,
+        })
+    return out
+
+
+def patrol_reports(cols, registry, guards):
+    """Route and per-floor completion times for each patrol seen in the window."""
+    ts, zones = cols.ts, cols.zone
+    out = []
+    for p, positions in cols.groups(cols.patrol):
+        if p < 0:
+            continue
+        session_id = cols.patrols[p]
+        route, floors, seen = [], {}, set()
+        for i in positions:
+            z = zones[i]
+            if z in seen:
+                continue
+            seen.add(z)
+            zone = registry.get(registry.order[z])
+            route.append(zone["id"])
+            floor = floors.get(zone["floor"])
+            if floor is None:
+                floor = floors[zone["floor"]] = {
+                    "floor": zone["floor"],
+                    "zones": 0,
+                    "total": registry.floor_counts(zone["floor"])[1],
+                    "started": ts[i],
+                    "completed": None,
+                }
+            floor["zones"] += 1
+            if floor["zones"] == floor["total"]:
+                floor["completed"] = ts[i]
+        for floor in floors.values():
+            done = floor["completed"]
+            floor["seconds"] = round(done - floor["started"], 1) if done is not None else None
+            floor["started"] = _iso(floor["started"])
+            floor["completed"] = _iso(done) if done is not None else None
+        out.append({
+            "id": session_id,
+            "guard": guards.get(session_id),
+            "first_scan": _iso(ts[positions[0]]),
+            "last_scan": _iso(ts[positions[-1]]),
+            "scans": len(positions),
+            "route": route,
+            # Floors in the order the guard first reached them
+            "floors": list(floors.values()),
+        })
+    return out
+
+
+class CoverageAnalytics:
+    """Coverage reports over the visit log, cached per time window.
+
+    A cached report is reused while nothing new has been scanned, and
+    otherwise for up to ``ttl`` seconds. Open-ended windows (no ``end``)
+    always expire after ``ttl``, since "missed" is measured from now.
+    """
+
+    def __init__(self, visit_log, registry, guards, ttl=30.0, max_entries=32):
+        self.visit_log = visit_log
+        self.registry = registry
+        self.guards = guards
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def report(self, start, end, missed_hours, version):
+        key = (start, end, missed_hours)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                cached_version, built, result = entry
+                if now - built < self.ttl or (end is not None and cached_version == version):
+                    self._cache.move_to_end(key)
+                    return result
+        result = self._build(start, end, missed_hours)
+        with self._lock:
+            self._cache[key] = (version, now, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def _build(self, start, end, missed_hours):
+        t0 = time.perf_counter()
+        cols = VisitColumns(self.visit_log.query(start=start, end=end), self.registry)
+        as_of = _epoch(end) if end else time.time()
+        patrols = patrol_reports(cols, self.registry, self.guards(cols.patrols))
+        return {
+            "start": start,
+            "end": end,
+            "as_of": _iso(as_of),
+            "scans": len(cols),
+            "missed_hours": missed_hours,
+            "missed": missed_zones(cols, self.registry, as_of, missed_hours),
+            "intervals": visit_intervals(cols, self.registry),
+            "patrols": patrols,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
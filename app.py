@@ -1,83 +1,80 @@
-from flask import Flask, render_template_string, jsonify, request
-from datetime import datetime
+from flask import Blueprint, Flask, Response, g, jsonify, request
+from datetime import datetime, timedelta
+import base64
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import time
+
+from assets import AssetManifest, encode_bodies
+from metrics import Metrics, SlowRequestProfiler
+from sites import Site, SiteDirectory
 
 app = Flask(__name__)
 
-# In-memory state (use a real DB in production)
-visited_zones = {}
-custom_zones = {}
-
-# Zones organized by floor
-zones_data = {
-    'Basement': [{'id': '10151853', 'location': 'Basement Interior', 'visited': False}],
-    'Floor 2': [
-        {'id': '10151808', 'location': 'Catwalk Stairwell', 'visited': False},
-        {'id': '10150864', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10151804', 'location': 'Gym', 'visited': False},
-        {'id': '10150871', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 3': [
-        {'id': '10151833', 'location': 'Patio & Lounge', 'visited': False},
-        {'id': '10150882', 'location': 'West Stairwell', 'visited': False},
-        {'id': '10150874', 'location': 'Catwalk Stairwell', 'visited': False}
-    ],
-    'Floor 4': [
-        {'id': '10151806', 'location': 'Catwalk Stairwell', 'visited': False},
-        {'id': '10151844', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10151851', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 5': [
-        {'id': '10151848', 'location': 'Catwalk Stairwell', 'visited': False},
-        {'id': '10151839', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10151815', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 6': [
-        {'id': '10151834', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10151842', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10150866', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 7': [
-        {'id': '10150873', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10151819', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10151811', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 8': [
-        {'id': '10150867', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10151814', 'location': 'East', 'visited': False},
-        {'id': '10151835', 'location': 'West', 'visited': False}
-    ],
-    'Floor 9': [
-        {'id': '10150881', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10150885', 'location': 'East', 'visited': False},
-        {'id': '10150887', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 10': [
-        {'id': '10150865', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10151807', 'location': 'East', 'visited': False},
-        {'id': '10151852', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 11': [
-        {'id': '10151805', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10151825', 'location': 'East', 'visited': False},
-        {'id': '10151816', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 12': [
-        {'id': '10150880', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10150884', 'location': 'East Stairwell', 'visited': False},
-        {'id': '10151829', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 14': [
-        {'id': '10150889', 'location': 'Alley Stairwell', 'visited': False},
-        {'id': '10150875', 'location': 'East', 'visited': False},
-        {'id': '10151818', 'location': 'West Stairwell', 'visited': False}
-    ],
-    'Floor 15': [
-        {'id': '10151837', 'location': '15th Floor', 'visited': False},
-        {'id': '10151827', 'location': 'Alley Stairwell', 'visited': False}
-    ],
-    'Floor 16': [{'id': '10151847', 'location': 'Penthouse', 'visited': False}],
-    'Floor 17': [{'id': '10150879', 'location': 'Floor 17', 'visited': False}]
-}
+HERE = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get("NFC_TOUR_DB", os.path.join(HERE, "nfc_tour.db"))
+LOG_DIR = os.environ.get("NFC_TOUR_LOG_DIR", os.path.join(os.path.dirname(DB_PATH), "visit_log"))
+# One data file per building (buildings/<slug>.json), compiled into a
+# snapshot that later boots load directly while the files are unchanged.
+BUILDINGS_DIR = os.environ.get("NFC_TOUR_BUILDINGS", os.path.join(HERE, "buildings"))
+SNAPSHOT_PATH = os.environ.get("NFC_TOUR_BUILDINGS_SNAPSHOT", os.path.join(os.path.dirname(DB_PATH), "buildings.snapshot"))
+SITES_DIR = os.environ.get("NFC_TOUR_SITES_DIR", os.path.join(os.path.dirname(DB_PATH), "sites"))
+# Served at the unprefixed routes; every building is also at /b/<slug>/.
+DEFAULT_BUILDING = os.environ.get("NFC_TOUR_DEFAULT_BUILDING", "plaza-555")
+DEDUP_SECONDS = float(os.environ.get("NFC_TOUR_DEDUP_SECONDS", "10"))
+
+def open_site(building):
+    # Each building has its own registry, database and visit log; the
+    # default one keeps the original paths.
+    if building.slug == DEFAULT_BUILDING:
+        return Site(building, DB_PATH, LOG_DIR, DEDUP_SECONDS)
+    os.makedirs(SITES_DIR, exist_ok=True)
+    base = os.path.join(SITES_DIR, building.slug)
+    return Site(building, base + ".db", base + ".visit_log", DEDUP_SECONDS)
+
+sites = SiteDirectory(BUILDINGS_DIR, SNAPSHOT_PATH, open_site)
+site_bp = Blueprint("site", __name__)
+
+# Worker snapshots are merged here so a scrape of any worker covers them all.
+metrics = Metrics(os.environ.get("NFC_TOUR_METRICS_DIR", DB_PATH + ".metrics"))
+# e.g. NFC_TOUR_PROFILE_SLOW_MS=200 logs a cProfile of sampled requests slower than 200ms
+PROFILE_SLOW_MS = os.environ.get("NFC_TOUR_PROFILE_SLOW_MS")
+profiler = SlowRequestProfiler(
+    float(PROFILE_SLOW_MS) / 1000, float(os.environ.get("NFC_TOUR_PROFILE_SAMPLE", "0.01"))
+) if PROFILE_SLOW_MS else None
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.profile = profiler.start() if profiler else None
+
+@site_bp.url_value_preprocessor
+def pick_site(endpoint, values):
+    slug = values.pop("building", DEFAULT_BUILDING) if values else DEFAULT_BUILDING
+    g.site = sites.get(slug)
+
+@site_bp.before_request
+def sync_store():
+    if g.site is None:
+        return jsonify({"success": False, "error": "Unknown building"}), 404
+    g.site.store.sync()
+
+@app.after_request
+def record_timing(resp):
+    started = g.pop("started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        # Same label whether the route was reached with or without /b/<slug>
+        endpoint = (request.endpoint or "unmatched").rsplit(".", 1)[-1]
+        metrics.observe(endpoint, elapsed)
+        prof = g.pop("profile", None)
+        if prof is not None:
+            profiler.stop(prof, "%s %s" % (request.method, request.path), elapsed)
+    return resp
 
 # Allow Web NFC on this origin (some hosts block it by default)
 @app.after_request
@@ -93,51 +90,19 @@ HTML = """
 <html lang="en">
 <head>
 <meta charset="utf-8">
-<title>Plaza 555 — NFC Tour</title>
+<title>{{ building }} — NFC Tour</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-  :root { --accent:#ff6b35; --bg:#111827; --card:#1f2937; --ok:#16a34a; --muted:#9ca3af; }
-  * { box-sizing:border-box; }
-  body { margin:0; font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell;
-         background:var(--bg); color:white; }
-  header { position:sticky; top:0; background:#0b1220; padding:12px 16px; border-bottom:1px solid #223;
-           display:flex; gap:12px; align-items:center; flex-wrap:wrap; }
-  h1 { margin:0; font-size:18px; font-weight:700; }
-  .row { display:flex; gap:8px; align-items:center; flex-wrap:wrap; margin-left:auto; }
-  select, input[type=text] { background:#0f172a; color:white; border:1px solid #334155; border-radius:8px; padding:8px 10px; }
-  button { background:var(--accent); color:white; border:0; border-radius:8px; padding:10px 12px; font-weight:700; cursor:pointer; }
-  button:disabled { opacity:.6; cursor:not-allowed; }
-  main { max-width:900px; margin:16px auto; padding:0 12px 80px; }
-  .stats { display:flex; gap:16px; margin:12px 0 16px; font-size:14px; color:var(--muted); }
-  .bar { height:8px; background:#233; border-radius:4px; overflow:hidden; }
-  .fill { height:100%; width:0%; background:linear-gradient(90deg,#22c55e,#84cc16); transition:width .3s ease; }
-  .list { display:grid; gap:10px; }
-  .card { background:var(--card); border:1px solid #243042; border-radius:12px; padding:12px; display:flex; gap:12px; align-items:center; justify-content:space-between; }
-  .meta { display:flex; flex-direction:column; gap:4px; }
-  .id { font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", monospace; color:var(--accent); }
-  .status { font-size:12px; color:var(--muted); }
-  .status.ok { color:#86efac; }
-  .toast { position:fixed; left:50%; transform:translateX(-50%); bottom:16px; background:#0f172a; color:white;
-           border:1px solid #334155; padding:10px 12px; border-radius:8px; display:none; z-index:1000; }
-  form.add { display:flex; gap:8px; flex-wrap:wrap; margin-top:8px; }
-  .hint { font-size:12px; color:var(--muted); margin-left:auto; }
-
-  /* NFC sheet */
-  .sheet { position:fixed; inset:0; background:rgba(0,0,0,.6); display:none; align-items:center; justify-content:center; z-index:999; }
-  .sheet .box { width:min(420px,92vw); background:#0f172a; border:1px solid #243042; border-radius:12px; padding:18px; }
-  .sheet h3 { margin:0 0 10px; font-size:18px; }
-  .sheet p { margin:8px 0; color:#cbd5e1; font-size:14px; }
-  .sheet .id { color:var(--accent); }
-  .sheet .row { margin-top:12px; justify-content:flex-end; }
-</style>
+<link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
-<body>
+<body data-total-zones="{{ total_zones }}">
 <header>
-  <h1>🏢 Plaza 555 — NFC Tour</h1>
+  <h1>🏢 {{ building }} — NFC Tour</h1>
   <div class="row">
     <label class="hint" id="envHint">Use Chrome on Android • HTTPS or localhost</label>
+    <button id="patrolBtn" onclick="togglePatrol()">Start patrol</button>
+    <button id="provisionBtn" onclick="startProvisioning()">Provision floor</button>
     <select id="floorSelect" aria-label="Choose floor">
-      {% for floor in zones_data.keys() %}
+      {% for floor in floors %}
         <option value="{{ floor }}">{{ floor }}</option>
       {% endfor %}
     </select>
@@ -157,22 +122,7 @@ HTML = """
 <main>
   <section>
     <h2 style="font-size:16px; margin:6px 0;">Zones</h2>
-    <div class="list" id="zoneList">
-      {% for floor, zones in zones_data.items() %}
-        {% for z in zones %}
-          <div class="card" data-floor="{{ floor }}" id="zone-{{ z.id }}">
-            <div class="meta">
-              <div><strong>{{ z.location }}</strong> <span style="opacity:.7">• {{ floor }}</span></div>
-              <div class="id">NFC: {{ z.id }}</div>
-              <div class="status" id="status-{{ z.id }}">Not visited</div>
-            </div>
-            <div style="display:flex; gap:8px;">
-              <button class="write" onclick="writeNFC('{{ z.id }}')">Write to NFC Tag</button>
-            </div>
-          </div>
-        {% endfor %}
-      {% endfor %}
-    </div>
+    <div class="list" id="zoneList"><div id="zoneSpacer"></div><div id="zoneRows"></div></div>
   </section>
 
   <section style="margin-top:24px;">
@@ -181,7 +131,7 @@ HTML = """
       <input type="text" id="tagId" placeholder="Tag ID (e.g. 10151999)" maxlength="8" inputmode="numeric" pattern="[0-9]{8}" required>
       <input type="text" id="tagLocation" placeholder="Location (e.g. Security Office)" required>
       <select id="tagFloor" required>
-        {% for floor in zones_data.keys() %}
+        {% for floor in floors %}
           <option value="{{ floor }}">{{ floor }}</option>
         {% endfor %}
       </select>
@@ -199,272 +149,623 @@ HTML = """
     <p id="sheetMsg">Hold the NFC tag against the phone to write<br>Value: <span class="id" id="sheetId"></span></p>
     <p id="sheetHint" style="font-size:12px; color:#94a3b8;">If nothing happens in ~20s, ensure NFC is ON and try a fresh tag.</p>
     <div class="row">
+      <button id="sheetSkip" onclick="skipProvisioning()" style="display:none">Skip</button>
       <button id="sheetClose" onclick="closeSheet()">Close</button>
     </div>
   </div>
 </div>
 
-<script>
-  // --- Simple state ---
-  const totalZones = {{ total_zones }};
-  let visited = new Set();
-  const zoneList = document.getElementById('zoneList');
-  const floorSelect = document.getElementById('floorSelect');
-
-  // --- Helpers ---
-  function showToast(msg, ok=false) {
-    const el = document.getElementById('toast');
-    el.textContent = msg;
-    el.style.display = 'block';
-    el.style.borderColor = ok ? '#14532d' : '#334155';
-    el.style.color = ok ? '#86efac' : 'white';
-    setTimeout(() => { el.style.display='none'; }, 2200);
-  }
-  function updateProgress() {
-    const v = visited.size;
-    const pct = totalZones ? Math.round((v/totalZones)*100) : 0;
-    document.getElementById('visitedCount').textContent = v;
-    document.getElementById('totalCount').textContent = totalZones;
-    document.getElementById('remainingCount').textContent = totalZones - v;
-    document.getElementById('progressFill').style.width = pct + '%';
-
-    const cur = floorSelect.value;
-    const cards = [...document.querySelectorAll('.card[data-floor="'+cur+'"]')];
-    const ok = cards.filter(c => c.classList.contains('visited')).length;
-    document.getElementById('floorStats').textContent = ok + '/' + cards.length;
-  }
-  function filterByFloor() {
-    const cur = floorSelect.value;
-    [...document.querySelectorAll('.card')].forEach(c => {
-      c.style.display = (c.dataset.floor === cur) ? '' : 'none';
-    });
-    updateProgress();
-  }
-  function markVisited(zoneId) {
-    visited.add(zoneId);
-    const card = document.getElementById('zone-' + zoneId);
-    const status = document.getElementById('status-' + zoneId);
-    if (card) card.classList.add('visited');
-    if (status) { status.textContent = 'Visited at ' + new Date().toLocaleTimeString(); status.classList.add('ok'); }
-    updateProgress();
-    fetch('/mark_visited', {
-      method: 'POST',
-      headers: {'Content-Type':'application/json'},
-      body: JSON.stringify({ zoneId })
-    }).catch(()=>{});
-  }
-
-  // --- NFC sheet controls ---
-  const sheet = document.getElementById('nfcSheet');
-  const sheetTitle = document.getElementById('sheetTitle');
-  const sheetMsg = document.getElementById('sheetMsg');
-  const sheetId = document.getElementById('sheetId');
-  function openSheet(title, msg, idText='') {
-    sheetTitle.textContent = title;
-    sheetMsg.innerHTML = msg;
-    sheetId.textContent = idText;
-    sheet.style.display = 'flex';
-  }
-  function closeSheet(){ sheet.style.display='none'; }
-
-  // --- NFC write with explicit UI + timeout + nicer errors ---
-  const NFC_TIMEOUT_MS = 20000;
-
-  async function writeNFC(zoneId) {
-    const btn = document.querySelector('#zone-' + zoneId + ' .write');
+<script src="{{ asset_url('app.js') }}"></script>
+</body>
+</html>
+"""
 
-    if (!('NDEFReader' in window)) {
-      showToast('Web NFC not supported. Use Chrome on Android.', false);
-      return;
-    }
-    if (!window.isSecureContext) {
-      showToast('This page is not HTTPS (or localhost). NFC blocked.', false);
-      return;
-    }
+# Styles and script live in static/ and are served under content-hashed
+# names, so browsers keep them until they change.
+assets = AssetManifest(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+app.jinja_env.globals["asset_url"] = assets.url
+
+# Compile the page once; renders are cached per registry version and only
+# redone when the set of zones changes.
+index_template = app.jinja_env.from_string(HTML)
+
+def rendered_page(site):
+    registry = site.registry
+    page = site.page
+    if page["version"] == registry.version:
+        return page
+    with site.page_lock:
+        if site.page["version"] == registry.version:
+            return site.page
+        version = registry.version
+        body = index_template.render(
+            building=site.building.name, floors=site.floors, total_zones=registry.total
+        ).encode("utf-8")
+        site.page = {"version": version, "etag": hashlib.sha256(body).hexdigest()[:32], "bodies": encode_bodies(body)}
+        return site.page
+
+def encoded_response(bodies, etag, mimetype, cache_control):
+    encoding = "identity"
+    for enc in ("br", "gzip"):
+        if enc in bodies and request.accept_encodings[enc]:
+            encoding = enc
+            break
+    # Strong ETag per representation, so a cached gzip body never validates
+    # against a brotli one.
+    etag = etag if encoding == "identity" else etag + "-" + encoding
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(bodies[encoding], mimetype=mimetype)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cache_control
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
 
-    // visible sheet
-    openSheet('Ready to write', 'Hold the NFC tag against the phone to write<br>Value: <span class="id" id="sheetId"></span>', zoneId);
-
-    let controller;
-    try {
-      btn.disabled = true;
-      btn.textContent = 'Hold tag to phone…';
-
-      controller = new AbortController();
-      const t = setTimeout(() => controller.abort('Timeout'), NFC_TIMEOUT_MS);
-
-      const ndef = new NDEFReader();
-
-      // Write an explicit text record (more interoperable than implicit string)
-      await ndef.write(
-        { records: [{ recordType: 'text', data: zoneId }] },
-        { signal: controller.signal }
-      );
-
-      clearTimeout(t);
-
-      // Success UI
-      sheetTitle.textContent = '✅ Written!';
-      sheetMsg.innerHTML = 'Tag successfully written with<br>Value: <span class="id">'+escapeHtml(zoneId)+'</span>';
-      if (navigator.vibrate) navigator.vibrate(80);
-      showToast('✅ Written: ' + zoneId, true);
-      markVisited(zoneId);
-    } catch (err) {
-      // Map common errors to friendly text
-      let msg = 'NFC error.';
-      if (err === 'Timeout' || (err && (err.name === 'AbortError'))) msg = 'Timed out waiting for a tag. Make sure NFC is ON and tap a tag.';
-      else if (err && err.name === 'NotAllowedError') msg = 'NFC permission denied. Tap again and allow when prompted.';
-      else if (err && err.name === 'NotSupportedError') msg = 'Device/Browser does not support NFC or it is disabled.';
-      else if (err && err.name === 'SecurityError') msg = 'Web NFC requires HTTPS (or http://localhost).';
-      else if (err && err.name === 'NetworkError') msg = 'NFC hardware busy/unavailable. Toggle NFC and retry.';
-      else if (err && err.message) msg = err.message;
-
-      sheetTitle.textContent = '❌ Failed';
-      sheetMsg.textContent = msg;
-      showToast('❌ ' + msg, false);
-      console.error('NFC write failed:', err);
-    } finally {
-      btn.disabled = false;
-      btn.textContent = 'Write to NFC Tag';
-    }
+@site_bp.route("/")
+def index():
+    page = rendered_page(g.site)
+    return encoded_response(page["bodies"], page["etag"], "text/html", "no-cache")
+
+@app.route("/assets/<name>")
+def asset(name):
+    f = assets.get(name)
+    if f is None:
+        return jsonify({"success": False, "error": "Unknown asset"}), 404
+    return encoded_response(f["bodies"], f["etag"], f["mimetype"], "public, max-age=31536000, immutable")
+
+# Precaches the shell, serves it (and the floors already fetched) from cache
+# first and refreshes them in the background, so the page opens with no signal.
+SERVICE_WORKER = """
+const CACHE = 'nfc-tour-{{ version }}';
+const SHELL = {{ shell|tojson }};
+
+self.addEventListener('install', (e) => {
+  e.waitUntil(caches.open(CACHE).then(c => c.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (e) => {
+  e.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k.startsWith('nfc-tour-') && k !== CACHE).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', (e) => {
+  const req = e.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.origin !== location.origin) return;
+
+  if (url.pathname.startsWith('/assets/')) {
+    // Fingerprinted, so a cached copy is always current
+    e.respondWith(caches.match(req).then(hit => hit || fetch(req)));
+    return;
   }
-
-  // --- Add custom tag ---
-  async function addCustom(e) {
-    e.preventDefault();
-    const id = document.getElementById('tagId').value.trim();
-    const location = document.getElementById('tagLocation').value.trim();
-    const floor = document.getElementById('tagFloor').value;
-
-    if (!/^[0-9]{8}$/.test(id)) {
-      showToast('Tag ID must be exactly 8 digits.', false);
-      return false;
-    }
-
-    try {
-      const res = await fetch('/add_custom_tag', {
-        method: 'POST',
-        headers: {'Content-Type':'application/json'},
-        body: JSON.stringify({ id, location, floor })
+  // Each building's page ('/' or '/b/<slug>/') and its floors
+  const parts = url.pathname.split('/');
+  const site = parts[1] === 'b' && parts.length > 3 ? '/b/' + parts[2] + '/' : '/';
+  const shell = req.mode === 'navigate' && url.pathname === site;
+  if (shell || url.pathname.startsWith(site + 'floors/')) {
+    const key = shell ? site : req;
+    e.respondWith(caches.open(CACHE).then(async (cache) => {
+      const hit = await cache.match(key);
+      const fresh = fetch(req).then(res => {
+        if (res.ok) cache.put(key, res.clone());
+        return res;
       });
-      const data = await res.json();
-      if (!data.success) throw new Error(data.error || 'Failed to add tag');
-
-      const card = document.createElement('div');
-      card.className = 'card';
-      card.dataset.floor = floor;
-      card.id = 'zone-' + id;
-      card.innerHTML = `
-        <div class="meta">
-          <div><strong>${escapeHtml(location)}</strong> <span style="opacity:.7">• ${escapeHtml(floor)}</span></div>
-          <div class="id">NFC: ${escapeHtml(id)}</div>
-          <div class="status" id="status-${escapeHtml(id)}">Not visited</div>
-        </div>
-        <div><button class="write" onclick="writeNFC('${escapeAttr(id)}')">Write to NFC Tag</button></div>
-      `;
-      document.getElementById('zoneList').appendChild(card);
-
-      document.getElementById('tagId').value = '';
-      document.getElementById('tagLocation').value = '';
-      showToast('Custom tag added.', true);
-      filterByFloor();
-    } catch (err) {
-      console.error(err);
-      showToast('❌ ' + (err.message || 'Add failed'), false);
-    }
-    return false;
+      if (!hit) return fresh;
+      e.waitUntil(fresh.catch(() => {}));
+      return hit;
+    }));
   }
-
-  function escapeHtml(s){ return s.replace(/[&<>"']/g, m=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#039;'}[m])); }
-  function escapeAttr(s){ return s.replace(/['"\\]/g, '\\$&'); }
-
-  // --- Init ---
-  document.addEventListener('DOMContentLoaded', () => {
-    const httpsOk = (location.protocol === 'https:') || (location.hostname === 'localhost' || location.hostname === '127.0.0.1');
-    if (!httpsOk) document.getElementById('envHint').textContent = '⚠️ Use HTTPS (or http://localhost) for NFC';
-
-    const fs = document.getElementById('floorSelect');
-    fs.value = fs.options[0].value;
-    fs.addEventListener('change', filterByFloor);
-    filterByFloor();
-
-    // Re-add any custom tags on reload
-    fetch('/get_custom_tags').then(r=>r.json()).then(data=>{
-      if (!data.tags) return;
-      for (const t of data.tags) {
-        if (document.getElementById('zone-' + t.id)) continue;
-        const card = document.createElement('div');
-        card.className = 'card';
-        card.dataset.floor = t.floor;
-        card.id = 'zone-' + t.id;
-        card.innerHTML = `
-          <div class="meta">
-            <div><strong>${escapeHtml(t.location)}</strong> <span style="opacity:.7">• ${escapeHtml(t.floor)}</span></div>
-            <div class="id">NFC: ${escapeHtml(t.id)}</div>
-            <div class="status" id="status-${escapeHtml(t.id)}">Not visited</div>
-          </div>
-          <div><button class="write" onclick="writeNFC('${escapeAttr(t.id)}')">Write to NFC Tag</button></div>
-        `;
-        document.getElementById('zoneList').appendChild(card);
-      }
-      filterByFloor();
-    }).catch(()=>{});
-  });
-</script>
-</body>
-</html>
+});
 """
+service_worker = app.jinja_env.from_string(SERVICE_WORKER).render(
+    version=assets.version, shell=["/"] + assets.urls()
+).encode("utf-8")
+service_worker_bodies = encode_bodies(service_worker)
+
+@app.route("/sw.js")
+def sw():
+    # Never fingerprinted or long-cached: browsers must see a new worker
+    # as soon as the assets it precaches change.
+    etag = hashlib.sha256(service_worker).hexdigest()[:32]
+    return encoded_response(service_worker_bodies, etag, "application/javascript", "no-cache")
+
+@site_bp.route("/floors/<floor>")
+def floor_zones(floor):
+    # The page loads one floor at a time; visits only ever flip a zone to
+    # visited, so the building definition, the version and the floor's
+    # counters identify its content.
+    registry = g.site.registry
+    zones = registry.floors.get(floor)
+    if zones is None:
+        return jsonify({"success": False, "error": "Unknown floor"}), 404
+    visited, total = registry.floor_counts(floor)
+    etag = "%s-%d-%d-%d" % (g.site.building.digest, registry.version, total, visited)
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify({
+            "floor": floor,
+            "visited": visited,
+            "total": total,
+            "zones": [{"id": z["id"], "location": z["location"], "floor": floor, "visited": z["visited"]} for z in list(zones)],
+        })
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
-@app.route("/")
-def index():
-    total = sum(len(z) for z in zones_data.values())
-    return render_template_string(HTML, zones_data=zones_data, total_zones=total)
-
-@app.route("/mark_visited", methods=["POST"])
+@site_bp.route("/mark_visited", methods=["POST"])
 def mark_visited():
+    site = g.site
     data = request.get_json(force=True, silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Expected a JSON object"})
     zone_id = data.get("zoneId")
+    session_id = data.get("sessionId")
+    if zone_id is not None and not isinstance(zone_id, (str, int)):
+        return jsonify({"success": False, "error": "zoneId must be a string"})
+    if session_id is not None and not isinstance(session_id, str):
+        return jsonify({"success": False, "error": "sessionId must be a string"})
+    # Numeric ids from older pages are stored as text, like batch scans.
+    zone_id = str(zone_id) if zone_id else zone_id
+    if session_id:
+        session = site.sessions.get(session_id)
+        if session is None:
+            return jsonify({"success": False, "error": "Unknown session"})
+        if session.closed is not None:
+            return jsonify({"success": False, "error": "Session closed"})
+    duplicate = False
     if zone_id:
-        visited_zones[zone_id] = {"timestamp": datetime.now().isoformat(), "visited": True}
-        for floor, zones in zones_data.items():
-            for z in zones:
-                if z["id"] == zone_id:
-                    z["visited"] = True
-    return jsonify({"success": True, "zone_id": zone_id})
-
-@app.route("/add_custom_tag", methods=["POST"])
-def add_custom_tag():
-    data = request.get_json(force=True, silent=True) or {}
-    tag_id = (data.get("id") or "").strip()
-    location = (data.get("location") or "").strip()
-    floor = (data.get("floor") or "").strip()
+        duplicate = site.dedup.seen((scan_client(data), zone_id))
+        if duplicate:
+            metrics.inc("scan_duplicates_total")
+        else:
+            site.store.record_visits([(zone_id, datetime.now().isoformat())], session_id)
+            metrics.inc("scans_total")
+    return jsonify({"success": True, "zone_id": zone_id, "duplicate": duplicate})
+
+def scan_client(scan):
+    return scan.get("sessionId") or scan.get("clientId") or request.remote_addr
+
+def scan_timestamp(client_timestamp):
+    # Queued scans carry the time they were taken on the phone (ISO 8601,
+    # usually UTC); store it in server-local time like live scans.
+    if isinstance(client_timestamp, str) and client_timestamp:
+        try:
+            ts = datetime.fromisoformat(client_timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+        else:
+            if ts.tzinfo is not None:
+                ts = ts.astimezone().replace(tzinfo=None)
+            return ts.isoformat()
+    return datetime.now().isoformat()
+
+@site_bp.route("/mark_visited_batch", methods=["POST"])
+def mark_visited_batch():
+    site = g.site
+    data = request.get_json(force=True, silent=True)
+    scans = data.get("scans") if isinstance(data, dict) else data
+    if not isinstance(scans, list):
+        return jsonify({"success": False, "error": "Expected a list of scans"})
+    # Group by patrol; scans queued under a session this server no longer
+    # knows, or taken after it closed, still count as plain visits.
+    batches = {}
+    zone_ids = []
+    duplicates = []
+    for s in scans:
+        if isinstance(s, dict) and s.get("zoneId"):
+            session_id = s.get("sessionId") or None
+            zone_id = str(s["zoneId"])
+            ts = scan_timestamp(s.get("client_timestamp"))
+            if session_id:
+                session = site.sessions.get(session_id)
+                if session is None or (session.closed is not None and ts > session.closed):
+                    session_id = None
+            # Queued scans are compared by when they were taken, not received.
+            if site.dedup.seen((scan_client(s), zone_id), datetime.fromisoformat(ts).timestamp()):
+                duplicates.append(zone_id)
+                continue
+            batches.setdefault(session_id, []).append((zone_id, ts))
+            zone_ids.append(zone_id)
+    for session_id, batch in batches.items():
+        site.store.record_visits(batch, session_id)
+    metrics.inc("scans_total", len(zone_ids))
+    metrics.inc("scan_duplicates_total", len(duplicates))
+    return jsonify({"success": True, "applied": len(zone_ids), "zone_ids": zone_ids, "duplicates": duplicates})
+
+def parse_tag(data):
+    """Return ``(tag, error)`` for a dict with id/location/floor fields."""
+    fields = [data.get(k) for k in ("id", "location", "floor")]
+    if any(v is not None and not isinstance(v, str) for v in fields):
+        return None, "id, location and floor must be strings"
+    tag_id, location, floor = [(v or "").strip() for v in fields]
     if not (tag_id and location and floor):
-        return jsonify({"success": False, "error": "Missing required fields"})
+        return None, "Missing required fields"
     if not tag_id.isdigit() or len(tag_id) != 8:
-        return jsonify({"success": False, "error": "Tag ID must be exactly 8 digits"})
-    custom_zones.setdefault(floor, []).append({"id": tag_id, "location": location, "visited": False})
-    zones_data.setdefault(floor, []).append({"id": tag_id, "location": location, "visited": False})
-    return jsonify({"success": True, "tag": {"id": tag_id, "location": location, "floor": floor}})
+        return None, "Tag ID must be exactly 8 digits"
+    return {"id": tag_id, "location": location, "floor": floor}, None
 
-@app.route("/get_custom_tags")
+@site_bp.route("/add_custom_tag", methods=["POST"])
+def add_custom_tag():
+    data = request.get_json(force=True, silent=True) or {}
+    tag, error = parse_tag(data)
+    if error:
+        return jsonify({"success": False, "error": error})
+    if g.site.store.add_zone(tag["floor"], tag["id"], tag["location"]) is None:
+        return jsonify({"success": False, "error": "Tag ID already exists"})
+    metrics.inc("custom_tags_added_total")
+    return jsonify({"success": True, "tag": tag})
+
+# Streamed bodies go out in writes of this many rows or bytes, whichever
+# comes first, rather than one socket write per row.
+STREAM_CHUNK_ROWS = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def batched(pieces):
+    batch, size = [], 0
+    for piece in pieces:
+        batch.append(piece)
+        size += len(piece)
+        if len(batch) >= STREAM_CHUNK_ROWS or size >= STREAM_CHUNK_BYTES:
+            yield "".join(batch)
+            batch, size = [], 0
+    if batch:
+        yield "".join(batch)
+
+@site_bp.route("/get_custom_tags")
 def get_custom_tags():
-    res = []
-    for floor, tags in custom_zones.items():
-        for t in tags:
-            res.append({"id": t["id"], "location": t["location"], "floor": floor})
-    return jsonify({"tags": res})
+    registry = g.site.registry
+
+    def generate():
+        yield '{"tags":['
+        sep = ""
+        for floor, t in registry.iter_custom():
+            yield sep + json.dumps({"floor": floor, "id": t["id"], "location": t["location"]})
+            sep = ","
+        yield "]}\n"
+    return Response(batched(generate()), mimetype="application/json")
+
+IMPORT_CHUNK = 500
+MAX_IMPORT_ERRORS = 1000
+
+def decode_lines(stream):
+    # Raw lines decoded one at a time, so a bad byte fails only its own line.
+    for n, raw in enumerate(stream, 1):
+        yield raw.decode("utf-8-sig" if n == 1 else "utf-8")
+
+def iter_import_rows(stream, fmt):
+    # Yields (line number, row dict or None, error or None) without reading
+    # the whole upload into memory.
+    if fmt == "jsonl":
+        for n, raw in enumerate(stream, 1):
+            try:
+                line = raw.decode("utf-8-sig" if n == 1 else "utf-8")
+            except UnicodeDecodeError:
+                yield n, None, "Not valid UTF-8"
+                continue
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield n, None, "Invalid JSON"
+                continue
+            if not isinstance(row, dict):
+                yield n, None, "Expected a JSON object"
+                continue
+            yield n, row, None
+    else:
+        # A CSV record can span lines, so after a bad one there is no safe
+        # place to resume; report it and stop with what was imported so far.
+        reader = csv.DictReader(decode_lines(stream))
+        try:
+            for row in reader:
+                yield reader.line_num, row, None
+        except UnicodeDecodeError:
+            yield reader.line_num + 1, None, "Not valid UTF-8; import stopped here"
+        except csv.Error as e:
+            yield reader.line_num + 1, None, "Invalid CSV (%s); import stopped here" % e
+
+@site_bp.route("/custom_tags/import", methods=["POST"])
+def import_custom_tags():
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    name = upload.filename if upload else ""
+    fmt = request.args.get("format")
+    if fmt is None:
+        kind = (upload.mimetype if upload else request.mimetype) or ""
+        fmt = "jsonl" if "json" in kind or name.endswith((".jsonl", ".ndjson")) else "csv"
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"success": False, "error": "Format must be csv or jsonl"})
+
+    store = g.site.store
+    imported = rejected = 0
+    errors = []
+    chunk = {}
+
+    def reject(n, tag_id, error):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"row": n, "id": tag_id, "error": error})
+
+    def commit():
+        nonlocal imported
+        added = set(store.add_zones([(t["floor"], t["id"], t["location"]) for _, t in chunk.values()]))
+        imported += len(added)
+        metrics.inc("custom_tags_added_total", len(added))
+        for tag_id, (n, _) in chunk.items():
+            if tag_id not in added:
+                reject(n, tag_id, "Tag ID already exists")
+        chunk.clear()
+
+    for n, row, error in iter_import_rows(stream, fmt):
+        if error is None:
+            tag, error = parse_tag(row)
+        if error is None and tag["id"] in chunk:
+            error = "Tag ID already exists"
+        if error:
+            reject(n, (row or {}).get("id"), error)
+            continue
+        chunk[tag["id"]] = (n, tag)
+        if len(chunk) >= IMPORT_CHUNK:
+            commit()
+    if chunk:
+        commit()
+    return jsonify({
+        "success": True,
+        "imported": imported,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+    })
 
-@app.route("/status")
+@site_bp.route("/custom_tags/export")
+def export_custom_tags():
+    registry = g.site.registry
+    fmt = request.args.get("format", "csv")
+    if fmt == "jsonl":
+        def generate():
+            for floor, t in registry.iter_custom():
+                yield json.dumps({"id": t["id"], "location": t["location"], "floor": floor}) + "\n"
+        mimetype = "application/x-ndjson"
+    elif fmt == "csv":
+        def generate():
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(["id", "location", "floor"])
+            for floor, t in registry.iter_custom():
+                writer.writerow([t["id"], t["location"], floor])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        mimetype = "text/csv"
+    else:
+        return jsonify({"success": False, "error": "Format must be csv or jsonl"})
+    resp = Response(batched(generate()), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = "attachment; filename=custom_tags.%s" % fmt
+    return resp
+
+MAX_PROVISION_BATCH = 5000
+
+@site_bp.route("/provisioning/<floor>", methods=["GET", "POST"])
+def provisioning(floor):
+    registry, store = g.site.registry, g.site.store
+    if floor not in registry.floors:
+        return jsonify({"success": False, "error": "Unknown floor"}), 404
+    if request.method == "GET":
+        return jsonify({"success": True, "floor": floor, "provisioned": store.provisioned(floor)})
+    # One confirmation for a whole floor's worth of tag writes:
+    # {"client": "...", "tags": [{"id": "10151808", "timestamp": "..."}, ...]}
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Expected a JSON object"})
+    tags = data.get("tags")
+    if not isinstance(tags, list) or not tags:
+        return jsonify({"success": False, "error": "Missing tags"})
+    if len(tags) > MAX_PROVISION_BATCH:
+        return jsonify({"success": False, "error": "At most %d tags per batch" % MAX_PROVISION_BATCH})
+    written, unknown = [], []
+    for tag in tags:
+        zone_id = str(tag.get("id", "")).strip() if isinstance(tag, dict) else ""
+        zone = registry.get(zone_id)
+        if zone is None or zone["floor"] != floor:
+            unknown.append(zone_id)
+            continue
+        written.append((zone_id, scan_timestamp(tag.get("timestamp"))))
+    client = data.get("clientId")
+    if not isinstance(client, str) or not client:
+        client = request.remote_addr
+    confirmed = store.record_provisioned(written, client) if written else 0
+    return jsonify({"success": True, "confirmed": confirmed, "unknown": unknown})
+
+def zones_version(site):
+    return "%s-%d" % (site.building.digest, site.registry.version)
+
+@site_bp.route("/status")
 def status():
-    total = sum(len(z) for z in zones_data.values())
-    visited = len(visited_zones)
-    return jsonify({
+    site = g.site
+    registry = site.registry
+    total = registry.total
+    visited = registry.visited_count
+    res = {
+        "version": site.store.version,
         "total_zones": total,
         "visited_zones": visited,
         "progress": round((visited / total * 100), 2) if total else 0,
-        "visited_list": list(visited_zones.keys())
+    }
+    since = request.args.get("since", type=int)
+    if since is not None:
+        # Only what changed after the caller's last poll; a reset means the
+        # cursor is too old and the full list follows instead.
+        changes = site.hub.since(since)
+        if changes and changes[0][1] == "reset":
+            res["reset"] = True
+            res["visited_list"] = list(registry.visited.keys())
+        else:
+            res["changes"] = [dict(payload, type=kind) for _, kind, payload in changes]
+    elif request.args.get("format") == "bitset":
+        # One bit per zone in registry order; callers fetch the order once per
+        # zones_version with ?zones=1. A reload starts a fresh registry, so
+        # the building digest keeps versions from different definitions apart.
+        res["zones_version"] = zones_version(site)
+        res["bitset"] = base64.b64encode(registry.bitset()).decode("ascii")
+        if request.args.get("zones"):
+            res["zone_ids"] = list(registry.order)
+    else:
+        res["visited_list"] = list(registry.visited.keys())
+    return jsonify(res)
+
+@site_bp.route("/sessions", methods=["GET", "POST"])
+def tour_sessions():
+    site = g.site
+    registry, sessions = site.registry, site.sessions
+    if request.method == "POST":
+        data = request.get_json(force=True, silent=True)
+        guard = data.get("guard") if isinstance(data, dict) else None
+        if guard is not None and not isinstance(guard, str):
+            return jsonify({"success": False, "error": "guard must be a string"})
+        guard = (guard or "").strip()
+        if not guard:
+            return jsonify({"success": False, "error": "Missing guard"})
+        session = site.store.start_session(guard, datetime.now().isoformat())
+        return jsonify({"success": True, "session": session.to_dict(registry.total)})
+    total = registry.total
+    return jsonify({
+        "active": [s.to_dict(total) for s in list(sessions.active.values())],
+        "recent": [s.to_dict(total) for s in reversed(list(sessions.history.values()))],
     })
 
+@site_bp.route("/sessions/<session_id>")
+def tour_session(session_id):
+    session = g.site.sessions.get(session_id)
+    if session is None:
+        return jsonify({"success": False, "error": "Unknown session"}), 404
+    res = session.to_dict(g.site.registry.total)
+    res["bitset"] = base64.b64encode(bytes(session.bits)).decode("ascii")
+    res["zones_version"] = zones_version(g.site)
+    return jsonify({"success": True, "session": res})
+
+@site_bp.route("/sessions/<session_id>/close", methods=["POST"])
+def close_tour_session(session_id):
+    session = g.site.store.close_session(session_id, datetime.now().isoformat())
+    if session is None:
+        return jsonify({"success": False, "error": "No open session with that id"})
+    return jsonify({"success": True, "session": session.to_dict(g.site.registry.total)})
+
+def local_iso(value):
+    """``value`` as the naive local ISO time the visit log stores; ValueError if unparseable."""
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    t = datetime.fromisoformat(value)
+    if t.tzinfo is not None:
+        t = t.astimezone().replace(tzinfo=None)
+    return t.isoformat()
+
+@site_bp.route("/visits/export")
+def export_visits():
+    # Audit trail of every scan, e.g. ?floor=Floor 7&start=2026-10-18T02:00&end=2026-10-18T04:00
+    # (start inclusive, end exclusive; offsets are converted to local time).
+    try:
+        start, end = (local_iso(request.args[k]) if request.args.get(k) else None for k in ("start", "end"))
+    except ValueError:
+        return jsonify({"success": False, "error": "start and end must be ISO 8601 times"})
+    records = g.site.visit_log.query(
+        start=start,
+        end=end,
+        floor=request.args.get("floor"),
+        zone_id=request.args.get("zone_id"),
+    )
+    fmt = request.args.get("format", "jsonl")
+    if fmt == "jsonl":
+        def generate():
+            for rec in records:
+                yield json.dumps(rec) + "\n"
+        mimetype = "application/x-ndjson"
+    elif fmt == "csv":
+        def generate():
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(["ts", "zone_id", "floor", "session"])
+            for rec in records:
+                writer.writerow([rec["ts"], rec["zone_id"], rec.get("floor") or "", rec.get("session") or ""])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        mimetype = "text/csv"
+    else:
+        return jsonify({"success": False, "error": "Format must be csv or jsonl"})
+    resp = Response(batched(generate()), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = "attachment; filename=visits.%s" % fmt
+    return resp
+
+@site_bp.route("/analytics/coverage")
+def coverage_report():
+    # e.g. ?start=2026-09-18T00:00&end=2026-10-18T00:00&missed_hours=12; the
+    # window defaults to the 30 days before end (or now), whole minutes only
+    # so repeated default requests share a cache entry.
+    try:
+        end = local_iso(request.args["end"]) if request.args.get("end") else None
+        as_of = datetime.fromisoformat(end) if end else datetime.now()
+        default_start = as_of.replace(second=0, microsecond=0) - timedelta(days=30)
+        start = local_iso(request.args["start"]) if request.args.get("start") else default_start.isoformat()
+    except ValueError:
+        return jsonify({"success": False, "error": "start and end must be ISO 8601 times"})
+    try:
+        missed_hours = float(request.args.get("missed_hours", "12"))
+    except ValueError:
+        missed_hours = math.nan
+    if not math.isfinite(missed_hours):
+        return jsonify({"success": False, "error": "missed_hours must be a number"})
+    if end is not None and not datetime.fromisoformat(start) < as_of:
+        return jsonify({"success": False, "error": "start must be before end"})
+    report = g.site.analytics.report(start, end, missed_hours, g.site.store.version)
+    return jsonify({"success": True, **report})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Summed over the buildings this worker has open.
+    open_sites = sites.open_sites()
+    gauges = [
+        ("buildings", "Buildings configured.", len(sites.buildings)),
+        ("open_buildings", "Buildings this worker has opened.", len(open_sites)),
+        ("zones", "Zones in the registry.", sum(s.registry.total for s in open_sites)),
+        ("visited_zones", "Zones with at least one recorded visit.", sum(s.registry.visited_count for s in open_sites)),
+        ("active_sessions", "Patrols currently open.", sum(len(s.sessions.active) for s in open_sites)),
+    ]
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+@site_bp.route("/events")
+def events():
+    # Live deltas for supervisors; EventSource resends Last-Event-ID on reconnect.
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    resp = Response(g.site.hub.stream(last_id), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/buildings")
+def list_buildings():
+    # Straight from the compiled snapshot; opens no sites.
+    return jsonify({
+        "default": DEFAULT_BUILDING,
+        "buildings": [b.to_dict() for b in sites.buildings.values()],
+    })
+
+app.register_blueprint(site_bp)
+app.register_blueprint(site_bp, url_prefix="/b/<building>", name="building")
+
 if __name__ == "__main__":
     # For Web NFC, use HTTPS in production. Chrome treats http://localhost as secure for development.
     app.run(host="0.0.0.0", port=5000, debug=False)
@@ -0,0 +1,59 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+def encode_bodies(body):
+    """Precompress ``body``; returns ``{content-coding: bytes}`` including identity."""
+    bodies = {"identity": body, "gzip": gzip.compress(body, 9)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body)
+    return bodies
+
+
+class AssetManifest:
+    """Static files served under content-hashed names.
+
+    Everything in ``directory`` is read and precompressed once; ``url()``
+    gives e.g. ``/assets/app.3f9a1c2b7d.js``, which changes whenever the file
+    does, so responses can be cached forever.
+    """
+
+    def __init__(self, directory, prefix="/assets/"):
+        self.prefix = prefix
+        self._urls = {}
+        self._files = {}
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            fingerprint = hashlib.sha256(body).hexdigest()[:10]
+            stem, ext = os.path.splitext(name)
+            hashed = "%s.%s%s" % (stem, fingerprint, ext)
+            self._urls[name] = prefix + hashed
+            self._files[hashed] = {
+                "etag": fingerprint,
+                "mimetype": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                "bodies": encode_bodies(body),
+            }
+            digest.update(hashed.encode("utf-8"))
+        # Changes whenever any asset does; names the service worker's cache.
+        self.version = digest.hexdigest()[:10]
+
+    def url(self, name):
+        return self._urls[name]
+
+    def urls(self):
+        return list(self._urls.values())
+
+    def get(self, hashed):
+        return self._files.get(hashed)
@@ -0,0 +1,313 @@
+"""Load/benchmark harness for the tour app.
+
+Synthesizes buildings of the requested sizes into throwaway data directories and
+drives every route either in-process (Flask test client) or over HTTP against
+a local gunicorn started with gunicorn.conf.py. Prints a table and writes the
+results as JSON so two runs can be diffed with ``compare``::
+
+    python benchmark.py run --sizes 100 10000 100000 --out before.json
+    python benchmark.py compare before.json after.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+ROUTES = {
+    "index": ("GET", "/"),
+    "mark_visited": ("POST", "/mark_visited"),
+    "add_custom_tag": ("POST", "/add_custom_tag"),
+    "get_custom_tags": ("GET", "/get_custom_tags"),
+    "status": ("GET", "/status"),
+    "floor": ("GET", "/floors/Floor%201"),
+}
+
+
+def bench_env(db):
+    """Environment that points the app at the throwaway data next to ``db``."""
+    tmp = os.path.dirname(db)
+    return {
+        "NFC_TOUR_DB": db,
+        "NFC_TOUR_BUILDINGS": os.path.join(tmp, "buildings"),
+        "NFC_TOUR_DEFAULT_BUILDING": "bench",
+        # Keep synthetic scans out of the real audit trail.
+        "NFC_TOUR_LOG_DIR": os.path.join(tmp, "visit_log"),
+    }
+
+
+def synth_building(db, size):
+    """Write a building data file of ``size`` zones spread over evenly sized floors."""
+    floors = max(5, min(200, size // 500))
+    doc = {"name": "Benchmark", "floors": {"Floor %d" % (f + 1): [] for f in range(floors)}}
+    for i in range(size):
+        doc["floors"]["Floor %d" % (i % floors + 1)].append({"id": "%08d" % (20000000 + i), "location": "Zone %d" % i})
+    directory = bench_env(db)["NFC_TOUR_BUILDINGS"]
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "bench.json"), "w") as f:
+        json.dump(doc, f)
+    return ["%08d" % (20000000 + i) for i in range(size)]
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def call(method, path, body=None):
+            return client.open(path, method=method, json=body).status_code
+
+        return call
+
+
+class HTTPDriver:
+    def __init__(self, port):
+        self.port = port
+
+    def session(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+
+        def call(method, path, body=None):
+            data = json.dumps(body) if body is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status
+
+        return call
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def summarize(route, samples, errors, elapsed):
+    samples.sort()
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "route": route,
+        "requests": len(ms),
+        "errors": errors,
+        "throughput_rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+
+def make_request(route, zone_ids, tag_ids):
+    method, path = ROUTES[route]
+    body = None
+    if route == "mark_visited":
+        # A fresh client per scan, so the dedup window never short-circuits
+        # a request and results stay comparable with earlier runs.
+        body = {"zoneId": random.choice(zone_ids), "clientId": "bench-%d" % next(tag_ids)}
+    elif route == "add_custom_tag":
+        n = next(tag_ids)
+        body = {"id": "%08d" % n, "location": "Bench %d" % n, "floor": "Floor 1"}
+    return method, path, body
+
+
+def drive(driver, plan, duration, zone_ids, tag_ids):
+    """Run ``plan`` (a list of route names, one per thread) for ``duration`` seconds."""
+    samples = {route: [] for route in plan}
+    errors = {route: 0 for route in plan}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(route):
+        call = driver.session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            method, path, body = make_request(route, zone_ids, tag_ids)
+            t0 = time.perf_counter()
+            try:
+                status = call(method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            local.append(time.perf_counter() - t0)
+            if status >= 400 or status == 0:
+                failed += 1
+        with lock:
+            samples[route].extend(local)
+            errors[route] += failed
+
+    threads = [threading.Thread(target=worker, args=(route,)) for route in plan]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return [summarize(route, samples[route], errors[route], elapsed) for route in samples]
+
+
+def scenarios(concurrency):
+    for route in ROUTES:
+        yield route, [route] * concurrency
+    # Patrol traffic: most threads scanning while supervisors poll /status.
+    pollers = max(1, concurrency // 4)
+    yield "mixed", ["mark_visited"] * (concurrency - pollers) + ["status"] * pollers
+
+
+def run_suite(driver, size, mode, args, zone_ids):
+    tag_ids = itertools.count(90000000)
+    results = []
+    for name, plan in scenarios(args.concurrency):
+        # Warm caches (rendered page, registry) before timing.
+        drive(driver, plan[:1], min(0.5, args.duration), zone_ids, tag_ids)
+        for row in drive(driver, plan, args.duration, zone_ids, tag_ids):
+            row.update(size=size, mode=mode, scenario=name)
+            results.append(row)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_inprocess(args):
+    # Runs in its own interpreter so app.py builds its state from this DB.
+    os.environ.update(bench_env(args.db))
+    import app as tour
+
+    site = tour.sites.get(tour.DEFAULT_BUILDING)
+    zone_ids = list(site.registry.order)
+    results = run_suite(TestClientDriver(tour.app), args.size, "inprocess", args, zone_ids)
+    site.store.flush()
+    json.dump(results, sys.stdout)
+
+
+def run_gunicorn(db, size, args):
+    port = free_port()
+    env = dict(os.environ, **bench_env(db))
+    cmd = [
+        sys.executable, "-m", "gunicorn", "-c", os.path.join(HERE, "gunicorn.conf.py"),
+        "--chdir", HERE, "-b", "127.0.0.1:%d" % port, "--workers", str(args.workers), "app:app",
+    ]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(300):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("gunicorn did not start on port %d" % port)
+        zone_ids = ["%08d" % (20000000 + i) for i in range(size)]
+        return run_suite(HTTPDriver(port), size, "gunicorn", args, zone_ids)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory() as tmp:
+                db = os.path.join(tmp, "bench.db")
+                synth_building(db, size)
+                if mode == "inprocess":
+                    cmd = [
+                        sys.executable, os.path.abspath(__file__), "inprocess", "--db", db, "--size", str(size),
+                        "--duration", str(args.duration), "--concurrency", str(args.concurrency),
+                    ]
+                    rows = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+                else:
+                    rows = run_gunicorn(db, size, args)
+            for row in rows:
+                print_row(row)
+            results.extend(rows)
+    doc = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+
+
+def print_row(row, extra=""):
+    print(
+        "%-9s %7d %-16s %-16s %9.1f rps  p50 %8.3f  p95 %8.3f  p99 %8.3f ms  err %d%s"
+        % (row["mode"], row["size"], row["scenario"], row["route"], row["throughput_rps"],
+           row["p50_ms"], row["p95_ms"], row["p99_ms"], row["errors"], extra)
+    )
+
+
+def compare(args):
+    def load(path):
+        with open(path) as f:
+            return {(r["mode"], r["size"], r["scenario"], r["route"]): r for r in json.load(f)["results"]}
+
+    old, new = load(args.old), load(args.new)
+    for key, row in new.items():
+        base = old.get(key)
+        if base is None:
+            print_row(row, "  (new)")
+            continue
+        delta = lambda field: (row[field] - base[field]) / base[field] * 100 if base[field] else 0.0  # noqa: E731
+        print_row(row, "  rps %+.1f%%  p99 %+.1f%%" % (delta("throughput_rps"), delta("p99_ms")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="benchmark every route")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    p.add_argument("--modes", nargs="+", choices=["inprocess", "gunicorn"], default=["inprocess", "gunicorn"])
+    p.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    p.add_argument("--out", help="write JSON results here")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="diff two JSON result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.set_defaults(func=compare)
+
+    p = sub.add_parser("inprocess")
+    p.add_argument("--db", required=True)
+    p.add_argument("--size", type=int, required=True)
+    p.add_argument("--duration", type=float, required=True)
+    p.add_argument("--concurrency", type=int, required=True)
+    p.set_defaults(func=run_inprocess)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+log = logging.getLogger(__name__)
+
+# Bumped whenever Building's layout changes, so old snapshots are recompiled.
+SNAPSHOT_FORMAT = 2
+
+
+class Building:
+    """One site's compiled definition, as loaded from ``<slug>.json``.
+
+    ``floors`` is the floor order, ``zones`` holds ``(id, location, floor
+    position)`` in building order, and ``index`` and ``floor_totals`` are
+    precomputed so listing or validating never walks the zones. ``digest``
+    identifies the definition, the same in every worker that loads it.
+    """
+
+    __slots__ = ("slug", "name", "floors", "zones", "index", "floor_totals", "digest")
+
+    def __init__(self, slug, name, floors, zones):
+        self.slug = slug
+        self.name = name
+        self.floors = tuple(floors)
+        self.zones = tuple(zones)
+        self.index = {z[0]: i for i, z in enumerate(self.zones)}
+        totals = [0] * len(self.floors)
+        for _, _, f in self.zones:
+            totals[f] += 1
+        self.floor_totals = tuple(totals)
+        self.digest = hashlib.sha256(repr((self.name, self.floors, self.zones)).encode()).hexdigest()[:16]
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    @property
+    def total(self):
+        return len(self.zones)
+
+    def zones_by_floor(self):
+        """Fresh ``{floor: [zone, ...]}`` dicts in the shape ZoneRegistry takes."""
+        floors = {floor: [] for floor in self.floors}
+        for zone_id, location, f in self.zones:
+            floors[self.floors[f]].append({"id": zone_id, "location": location, "visited": False})
+        return floors
+
+    def to_dict(self):
+        return {
+            "slug": self.slug,
+            "name": self.name,
+            "total_zones": self.total,
+            "floors": [{"floor": f, "total": n} for f, n in zip(self.floors, self.floor_totals)],
+        }
+
+
+def parse_building(slug, doc):
+    """Build a Building from a data file's JSON; raises ValueError naming the problem."""
+    if not isinstance(doc, dict) or not isinstance(doc.get("floors"), dict):
+        raise ValueError("%s: expected an object with a 'floors' mapping" % slug)
+    floors, zones, seen = [], [], set()
+    for floor, entries in doc["floors"].items():
+        if not isinstance(entries, list):
+            raise ValueError("%s: floor %r must be a list of zones" % (slug, floor))
+        for z in entries:
+            zone_id = str(z.get("id") or "").strip() if isinstance(z, dict) else ""
+            location = str(z.get("location") or "").strip() if isinstance(z, dict) else ""
+            if not (zone_id and location):
+                raise ValueError("%s: every zone on %r needs an id and a location" % (slug, floor))
+            if zone_id in seen:
+                raise ValueError("%s: zone id %s appears twice" % (slug, zone_id))
+            seen.add(zone_id)
+            zones.append((zone_id, location, len(floors)))
+        floors.append(floor)
+    return Building(slug, str(doc.get("name") or slug), floors, zones)
+
+
+def source_signature(directory):
+    """What the snapshot was compiled from: ``(file, size, mtime)`` per data file."""
+    sig = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        st = os.stat(path)
+        sig.append((os.path.basename(path), st.st_size, st.st_mtime_ns))
+    return tuple(sig)
+
+
+def compile_buildings(directory, signature=None):
+    """Parse every ``*.json`` in ``directory`` into ``{slug: Building}``."""
+    buildings = {}
+    for name, _, _ in signature if signature is not None else source_signature(directory):
+        slug = name[:-len(".json")]
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            try:
+                doc = json.load(f)
+            except ValueError as e:
+                raise ValueError("%s: %s" % (slug, e))
+        buildings[slug] = parse_building(slug, doc)
+    return buildings
+
+
+def load_buildings(directory, snapshot_path):
+    """Return ``(signature, {slug: Building})``.
+
+    Loads the precompiled snapshot when it was built from exactly the files
+    now in ``directory``; otherwise compiles them and rewrites the snapshot
+    for the next boot.
+    """
+    signature = source_signature(directory)
+    try:
+        with open(snapshot_path, "rb") as f:
+            snap = pickle.load(f)
+        if snap["format"] == SNAPSHOT_FORMAT and snap["signature"] == signature:
+            return signature, snap["buildings"]
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError, AttributeError, TypeError):
+        pass
+    buildings = compile_buildings(directory, signature)
+    tmp = "%s.%d.tmp" % (snapshot_path, os.getpid())
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"format": SNAPSHOT_FORMAT, "signature": signature, "buildings": buildings},
+                f, protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, snapshot_path)
+    except OSError:
+        log.exception("Failed to write building snapshot %s", snapshot_path)
+    return signature, buildings
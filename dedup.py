@@ -0,0 +1,39 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ScanDeduplicator:
+    """Remembers recent ``(client, zone)`` scans to absorb double taps and retries.
+
+    Entries sit in insertion order, so expired ones are trimmed from the
+    front as new scans come in, and the cache never holds more than
+    ``max_entries`` keys.
+    """
+
+    def __init__(self, window=10.0, max_entries=10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, key, when=None):
+        """True if ``key`` was scanned within ``window`` seconds of ``when`` (epoch seconds)."""
+        now = time.monotonic()
+        if when is None:
+            when = time.time()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and abs(when - entry[0]) < self.window:
+                return True
+            # Entries are kept in order of arrival, which is what expiry
+            # goes by even for queued scans taken long ago.
+            self._seen[key] = (when, now)
+            self._seen.move_to_end(key)
+            horizon = now - self.window
+            while self._seen:
+                arrived = next(iter(self._seen.values()))[1]
+                if arrived >= horizon and len(self._seen) <= self.max_entries:
+                    break
+                self._seen.popitem(last=False)
+            return False
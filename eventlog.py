@@ -0,0 +1,130 @@
+import bisect
+import glob
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+from itertools import accumulate
+
+# Segment sequence numbers are per process, not per log, so two logs on one
+# directory (e.g. a site reopened after a config reload) never share a file.
+_segments = itertools.count(1)
+
+
+class VisitLog:
+    """Append-only, segment-rotated log of every scan.
+
+    Each process appends JSON lines to its own segment files, so gunicorn
+    workers never contend for a file. Every ``block_records`` lines a block
+    entry ``start end min_ts max_ts`` goes into the segment's ``.idx``
+    sidecar. Scans can arrive late (offline queues), so blocks are not
+    strictly ordered; range queries bisect on the running maximum and the
+    suffix minimum of block timestamps, which are, and then read only the
+    matching blocks from disk.
+    """
+
+    def __init__(self, directory, segment_bytes=16 << 20, block_records=256):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._idx = None
+        self._block = None
+        self._index_cache = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        self._close_segment()
+        name = "%s-%d-%d" % (datetime.now().strftime("%Y%m%dT%H%M%S"), os.getpid(), next(_segments))
+        path = os.path.join(self.directory, name)
+        self._file = open(path + ".log", "ab")
+        self._idx = open(path + ".idx", "a")
+
+    def _close_block(self):
+        if self._block is not None:
+            start, lo, hi = self._block[:3]
+            self._idx.write("%d %d %s %s\n" % (start, self._file.tell(), lo, hi))
+            self._idx.flush()
+            self._block = None
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._close_block()
+            self._file.close()
+            self._idx.close()
+            self._file = self._idx = None
+
+    def append(self, records):
+        """Append scan records (dicts with at least ``ts``)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's files are not ours to write to.
+                self._pid = os.getpid()
+                self._file = self._idx = self._block = None
+            for rec in records:
+                if self._file is None or self._file.tell() >= self.segment_bytes:
+                    self._rotate()
+                ts = rec["ts"]
+                if self._block is None:
+                    self._block = [self._file.tell(), ts, ts, 0]
+                block = self._block
+                block[1] = min(block[1], ts)
+                block[2] = max(block[2], ts)
+                block[3] += 1
+                self._file.write(json.dumps(rec, separators=(",", ":")).encode("utf-8") + b"\n")
+                if block[3] >= self.block_records:
+                    self._close_block()
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def _blocks(self, idx_path):
+        size = os.path.getsize(idx_path)
+        cached = self._index_cache.get(idx_path)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        blocks = []
+        with open(idx_path) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    start, end, lo, hi = line.split()
+                    blocks.append((int(start), int(end), lo, hi))
+        self._index_cache[idx_path] = (size, blocks)
+        return blocks
+
+    def query(self, start=None, end=None, floor=None, zone_id=None):
+        """Yield records with ``start <= ts < end``, segment by segment."""
+        lo_ts = start or ""
+        hi_ts = end or "\uffff"
+        for log_path in sorted(glob.glob(os.path.join(self.directory, "*.log"))):
+            blocks = self._blocks(log_path[:-4] + ".idx")
+            spans = []
+            if blocks:
+                running_max = list(accumulate((b[3] for b in blocks), max))
+                suffix_min = list(accumulate((b[2] for b in reversed(blocks)), min))[::-1]
+                first = bisect.bisect_left(running_max, lo_ts)
+                stop = bisect.bisect_left(suffix_min, hi_ts)
+                spans = [(b[0], b[1]) for b in blocks[first:stop]]
+            # Lines after the last indexed block have no bounds yet.
+            tail = blocks[-1][1] if blocks else 0
+            with open(log_path, "rb") as f:
+                for begin, finish in spans + [(tail, None)]:
+                    f.seek(begin)
+                    while finish is None or f.tell() < finish:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break  # end of file, or a line still being written
+                        rec = json.loads(line.decode("utf-8"))
+                        if not lo_ts <= rec["ts"] < hi_ts:
+                            continue
+                        if floor is not None and rec.get("floor") != floor:
+                            continue
+                        if zone_id is not None and rec.get("zone_id") != zone_id:
+                            continue
+                        yield rec
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+def format_event(version, name, payload):
+    return "id: %d\nevent: %s\ndata: %s\n\n" % (version, name, json.dumps(payload, separators=(",", ":")))
+
+
+class EventHub:
+    """Fans store changes out to Server-Sent Events clients.
+
+    One poller per process keeps the store synced; each change becomes a
+    small delta tagged with its store version and kept in a bounded backlog,
+    so a reconnecting client resumes from ``Last-Event-ID`` without hitting
+    the database. Clients only wait on a shared condition, which costs a
+    greenlet apiece under the gevent workers in gunicorn.conf.py.
+    """
+
+    def __init__(self, store, backlog=1000, poll_interval=0.25, heartbeat=15):
+        self.store = store
+        self.registry = store.registry
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._events = deque(maxlen=backlog)
+        self._cond = threading.Condition()
+        self._poller_pid = None
+        self._closed = False
+        store.listeners.append(self.publish)
+
+    def _delta(self, row):
+        version, kind, zone_id, floor, location, timestamp, session = row
+        if kind in ("session_start", "session_close"):
+            payload = {"version": version, "session": session, "timestamp": timestamp}
+            if kind == "session_start":
+                payload["guard"] = location
+            return version, kind, payload
+        zone = self.registry.get(zone_id)
+        if zone is not None:
+            floor = zone["floor"]
+        floor_visited, floor_total = self.registry.floor_counts(floor)
+        payload = {
+            "version": version,
+            "zone_id": zone_id,
+            "floor": floor,
+            "floor_visited": floor_visited,
+            "floor_total": floor_total,
+            "visited_zones": self.registry.visited_count,
+            "total_zones": self.registry.total,
+        }
+        if kind == "visit":
+            payload["timestamp"] = timestamp
+            if session:
+                payload["session"] = session
+        else:
+            payload["location"] = location
+        return version, kind, payload
+
+    def _reset(self):
+        version = self.store.version
+        return version, "reset", {"version": version}
+
+    def publish(self, rows):
+        with self._cond:
+            if rows is None:
+                self._events.clear()
+                self._events.append(self._reset())
+            else:
+                self._events.extend(self._delta(r) for r in rows)
+            self._cond.notify_all()
+
+    def since(self, version):
+        """Deltas after ``version``; a single reset event if they are no longer available."""
+        with self._cond:
+            if self._events and self._events[0][0] <= version + 1:
+                return [e for e in self._events if e[0] > version]
+        if version >= self.store.version:
+            return []
+        rows = self.store.changes_since(version)
+        if rows is None:
+            return [self._reset()]
+        return [self._delta(r) for r in rows]
+
+    def close(self):
+        """Stop polling and end open streams; their clients reconnect elsewhere."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _poll(self):
+        while not self._closed:
+            try:
+                self.store.sync()
+            except Exception:
+                log.exception("Event hub failed to sync the store")
+            time.sleep(self.poll_interval)
+
+    def _start_poller(self):
+        with self._cond:
+            if self._poller_pid != os.getpid():
+                self._poller_pid = os.getpid()
+                threading.Thread(target=self._poll, name="event-hub-poller", daemon=True).start()
+
+    def stream(self, last_id=None):
+        self._start_poller()
+        version = self.store.version if last_id is None else last_id
+        yield "retry: 3000\n\n"
+        while not self._closed:
+            for event in self.since(version):
+                version = event[0]
+                yield format_event(*event)
+            idle = False
+            with self._cond:
+                latest = self._events[-1][0] if self._events else version
+                if latest <= version and not self._closed:
+                    idle = not self._cond.wait(self.heartbeat)
+            if idle:
+                yield ": keepalive\n\n"
@@ -0,0 +1,15 @@
+# /events holds a connection open per supervisor, so run gevent workers:
+# each idle stream is then a parked greenlet rather than a blocked worker.
+worker_class = "gevent"
+worker_connections = 1000
+workers = 2
+
+
+def on_starting(server):
+    # Worker pids from a previous run may be reused by unrelated processes,
+    # so start every run with an empty metrics directory.
+    import os
+    from metrics import clear_snapshots
+    here = os.path.dirname(os.path.abspath(__file__))
+    db = os.environ.get("NFC_TOUR_DB", os.path.join(here, "nfc_tour.db"))
+    clear_snapshots(os.environ.get("NFC_TOUR_METRICS_DIR", db + ".metrics"))
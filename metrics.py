@@ -0,0 +1,177 @@
+import bisect
+import cProfile
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds; one extra slot counts everything slower (+Inf).
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+COUNTERS = {
+    "scans_total": "Scans recorded.",
+    "scan_duplicates_total": "Scans absorbed as duplicates.",
+    "custom_tags_added_total": "Custom tags added, singly or by import.",
+}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def clear_snapshots(directory):
+    """Remove every worker snapshot in ``directory``; run once as a server starts."""
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            os.remove(path)
+        except OSError:
+            log.exception("Failed to remove metrics snapshot %s", path)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Fixed-bucket request histograms and counters, in Prometheus text format.
+
+    Each process keeps its own numbers in memory (an observe is a bisect and
+    two additions under a lock). When ``directory`` is set, every worker
+    also drops a snapshot there every few seconds, and ``render`` sums all
+    snapshots so any worker can answer a scrape for the whole deployment.
+    Snapshots of workers that have since exited are deleted rather than
+    summed, so a restarted worker's numbers are not counted twice.
+    """
+
+    def __init__(self, directory=None, persist_every=5.0, prefix="nfc_tour"):
+        self.directory = directory
+        self.persist_every = persist_every
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._persisted_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def observe(self, endpoint, seconds):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            h = self._histograms.get(endpoint)
+            if h is None:
+                h = self._histograms[endpoint] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0}
+            h["buckets"][i] += 1
+            h["sum"] += seconds
+        if self.directory and time.monotonic() - self._persisted_at >= self.persist_every:
+            self.persist()
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": {k: {"buckets": list(v["buckets"]), "sum": v["sum"]} for k, v in self._histograms.items()},
+                "counters": dict(self._counters),
+            }
+
+    def persist(self):
+        self._persisted_at = time.monotonic()
+        path = os.path.join(self.directory, "%d.json" % os.getpid())
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            log.exception("Failed to write metrics snapshot %s", path)
+
+    def _combined(self):
+        if not self.directory:
+            return self.snapshot()
+        self.persist()
+        total = {"histograms": {}, "counters": dict.fromkeys(COUNTERS, 0)}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            pid = os.path.basename(path)[:-len(".json")]
+            if not pid.isdigit() or not _alive(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, value in snap["counters"].items():
+                total["counters"][name] = total["counters"].get(name, 0) + value
+            for endpoint, h in snap["histograms"].items():
+                t = total["histograms"].setdefault(endpoint, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0})
+                t["buckets"] = [a + b for a, b in zip(t["buckets"], h["buckets"])]
+                t["sum"] += h["sum"]
+        return total
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; ``gauges`` is ``(name, help, value)`` tuples."""
+        snap = self._combined()
+        p = self.prefix
+        out = [
+            "# HELP %s_request_duration_seconds Request handling time by endpoint." % p,
+            "# TYPE %s_request_duration_seconds histogram" % p,
+        ]
+        for endpoint in sorted(snap["histograms"]):
+            h = snap["histograms"][endpoint]
+            label = _label(endpoint)
+            running = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), h["buckets"]):
+                running += n
+                out.append('%s_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d' % (p, label, bound, running))
+            out.append('%s_request_duration_seconds_sum{endpoint="%s"} %.6f' % (p, label, h["sum"]))
+            out.append('%s_request_duration_seconds_count{endpoint="%s"} %d' % (p, label, running))
+        for name, help_text in COUNTERS.items():
+            out.append("# HELP %s_%s %s" % (p, name, help_text))
+            out.append("# TYPE %s_%s counter" % (p, name))
+            out.append("%s_%s %d" % (p, name, snap["counters"].get(name, 0)))
+        for name, help_text, value in gauges:
+            out.append("# HELP %s_%s %s" % (p, name, help_text))
+            out.append("# TYPE %s_%s gauge" % (p, name))
+            out.append("%s_%s %s" % (p, name, value))
+        return "\n".join(out) + "\n"
+
+
+class SlowRequestProfiler:
+    """Profiles a random ``sample_rate`` of requests and logs those slower than ``threshold`` seconds."""
+
+    def __init__(self, threshold, sample_rate=0.01, top=25):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.top = top
+
+    def start(self):
+        if random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, label, seconds):
+        profiler.disable()
+        if seconds < self.threshold:
+            return
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(self.top)
+        log.warning("Slow request %s took %.1f ms\n%s", label, seconds * 1000, buf.getvalue())
@@ -0,0 +1,138 @@
+import threading
+from collections.abc import Mapping
+
+
+class ZoneRegistry:
+    """Holds every zone once, indexed by id, with running visit counters.
+
+    ``floors`` keeps the ``{floor: [zone, ...]}`` shape the template renders,
+    while ``_index`` maps a zone id straight to its zone dict so scans and
+    status reads never have to walk the building.
+    """
+
+    def __init__(self, floors=None):
+        self._lock = threading.RLock()
+        self.floors = {}
+        self.visited = {}
+        self.custom = CustomZonesView(self)
+        self._index = {}
+        self._custom_ids = {}
+        self._floor_total = {}
+        self._floor_visited = {}
+        self._visited_total = 0
+        # Stable zone ordering (ids in insertion order) and a bit per zone in
+        # that order, set once the zone is visited.
+        self.order = []
+        self._bits = bytearray()
+        # Bumped whenever the set of zones changes (not on visits); render
+        # caches key off it.
+        self.version = 0
+        for floor, zones in (floors or {}).items():
+            self.floors.setdefault(floor, [])
+            self._floor_total.setdefault(floor, 0)
+            self._floor_visited.setdefault(floor, 0)
+            for z in zones:
+                self._insert(floor, z)
+
+    def _insert(self, floor, zone):
+        zone.setdefault("visited", False)
+        zone["floor"] = floor
+        zone["index"] = len(self.order)
+        self.order.append(zone["id"])
+        if zone["index"] >> 3 >= len(self._bits):
+            self._bits.append(0)
+        self.floors.setdefault(floor, []).append(zone)
+        self._index[zone["id"]] = zone
+        self._floor_total[floor] = self._floor_total.get(floor, 0) + 1
+        self._floor_visited.setdefault(floor, 0)
+        if zone["visited"]:
+            self._set_bit(zone["index"])
+            self._floor_visited[floor] += 1
+            self._visited_total += 1
+
+    def _set_bit(self, i):
+        self._bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, zone_id):
+        return zone_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, zone_id):
+        return self._index.get(zone_id)
+
+    def add(self, floor, zone_id, location, custom=False):
+        """Add a zone; returns None if the id is already registered."""
+        with self._lock:
+            if zone_id in self._index:
+                return None
+            zone = {"id": zone_id, "location": location, "visited": False}
+            self._insert(floor, zone)
+            if custom:
+                self._custom_ids.setdefault(floor, []).append(zone_id)
+            self.version += 1
+            return zone
+
+    def mark_visited(self, zone_id, timestamp):
+        """Record a scan; returns True the first time a known zone is visited."""
+        with self._lock:
+            self.visited[zone_id] = {"timestamp": timestamp, "visited": True}
+            zone = self._index.get(zone_id)
+            if zone is None or zone["visited"]:
+                return False
+            zone["visited"] = True
+            self._set_bit(zone["index"])
+            self._floor_visited[zone["floor"]] += 1
+            self._visited_total += 1
+            return True
+
+    def mark_visited_many(self, scans):
+        """Apply ``(zone_id, timestamp)`` pairs under one lock; returns newly visited ids."""
+        newly = []
+        with self._lock:
+            for zone_id, timestamp in scans:
+                if self.mark_visited(zone_id, timestamp):
+                    newly.append(zone_id)
+        return newly
+
+    def iter_custom(self):
+        """Yield ``(floor, zone)`` for every custom tag without copying the lists."""
+        for floor in list(self._custom_ids):
+            ids = self._custom_ids[floor]
+            for i in range(len(ids)):
+                yield floor, self._index[ids[i]]
+
+    @property
+    def total(self):
+        return len(self._index)
+
+    @property
+    def visited_count(self):
+        # Matches the old len(visited_zones): scans of unknown ids still count.
+        return len(self.visited)
+
+    def bitset(self):
+        """Visited flags as bytes, bit ``i`` (LSB first) for ``order[i]``."""
+        with self._lock:
+            return bytes(self._bits)
+
+    def floor_counts(self, floor):
+        return self._floor_visited.get(floor, 0), self._floor_total.get(floor, 0)
+
+
+class CustomZonesView(Mapping):
+    """Read-only ``{floor: [zone, ...]}`` view of the custom tags in a registry."""
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getitem__(self, floor):
+        ids = self._registry._custom_ids[floor]
+        return [self._registry._index[i] for i in ids]
+
+    def __iter__(self):
+        return iter(list(self._registry._custom_ids))
+
+    def __len__(self):
+        return len(self._registry._custom_ids)
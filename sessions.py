@@ -0,0 +1,89 @@
+import secrets
+import threading
+from collections import OrderedDict
+
+
+class TourSession:
+    """One patrol: which zones it has covered, as a bit per registry index."""
+
+    __slots__ = ("id", "guard", "started", "closed", "bits", "visited")
+
+    def __init__(self, session_id, guard, started, closed=None):
+        self.id = session_id
+        self.guard = guard
+        self.started = started
+        self.closed = closed
+        self.bits = bytearray()
+        self.visited = 0
+
+    def mark(self, index):
+        byte, bit = index >> 3, 1 << (index & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.visited += 1
+        return True
+
+    def to_dict(self, total):
+        return {
+            "id": self.id,
+            "guard": self.guard,
+            "started": self.started,
+            "closed": self.closed,
+            "visited_zones": self.visited,
+            "total_zones": total,
+            "progress": round((self.visited / total * 100), 2) if total else 0,
+        }
+
+
+class SessionManager:
+    """Active patrols plus a bounded, oldest-first-evicted history of closed ones."""
+
+    def __init__(self, registry, history=200):
+        self.registry = registry
+        self.history_size = history
+        self.active = {}
+        self.history = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id():
+        return secrets.token_hex(8)
+
+    def get(self, session_id):
+        return self.active.get(session_id) or self.history.get(session_id)
+
+    def start(self, session_id, guard, timestamp):
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                session = self.active[session_id] = TourSession(session_id, guard, timestamp)
+            return session
+
+    def scan(self, session_id, zone_id, timestamp=None):
+        """Mark a zone in a session; None if the session or zone is unknown.
+
+        A closed session only takes scans with a ``timestamp`` (ISO, like
+        ``closed``) at or before its close, i.e. ones queued offline.
+        """
+        zone = self.registry.get(zone_id)
+        with self._lock:
+            session = self.get(session_id)
+            if session is None or zone is None:
+                return None
+            if session.closed is not None and (timestamp is None or timestamp > session.closed):
+                return None
+            return session.mark(zone["index"])
+
+    def close(self, session_id, timestamp):
+        with self._lock:
+            session = self.active.pop(session_id, None)
+            if session is None:
+                return self.history.get(session_id)
+            session.closed = timestamp
+            self.history[session_id] = session
+            while len(self.history) > self.history_size:
+                self.history.popitem(last=False)
+            return session
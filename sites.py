@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+from analytics import CoverageAnalytics
+from buildings import load_buildings, source_signature
+from dedup import ScanDeduplicator
+from eventlog import VisitLog
+from events import EventHub
+from registry import ZoneRegistry
+from store import ZoneStore
+
+log = logging.getLogger(__name__)
+
+
+class Site:
+    """Everything one building needs at runtime, opened on its first request."""
+
+    def __init__(self, building, db_path, log_dir, dedup_seconds=10.0):
+        self.building = building
+        self.registry = ZoneRegistry(building.zones_by_floor())
+        self.visit_log = VisitLog(log_dir)
+        self.store = ZoneStore(db_path, self.registry, visit_log=self.visit_log)
+        self.sessions = self.store.sessions
+        self.hub = EventHub(self.store)
+        self.analytics = CoverageAnalytics(self.visit_log, self.registry, self.store.session_guards)
+        # Repeat scans of a zone by the same patrol/phone inside this window
+        # are acknowledged as duplicates without touching the store.
+        self.dedup = ScanDeduplicator(dedup_seconds)
+        # Rendered page, per registry version; see app.rendered_page().
+        self.page = {"version": None}
+        self.page_lock = threading.Lock()
+
+    @property
+    def floors(self):
+        """Floors in the configured order, then any only custom tags use."""
+        floors = list(self.building.floors)
+        known = set(floors)
+        floors.extend(f for f in self.registry.floors if f not in known)
+        return floors
+
+    def close(self):
+        self.hub.close()
+        self.store.close()
+        self.visit_log.close()
+
+
+class SiteDirectory:
+    """Buildings from a directory of data files, each served as a lazily opened Site.
+
+    The compiled definitions are held as one ``(signature, buildings)``
+    tuple and replaced whole, so a reload never shows a request half the
+    old set and half the new. At most every ``check_interval`` seconds a
+    lookup stats the data files; if they changed, the directory is
+    recompiled and any open site whose definition changed is swapped for a
+    fresh one. Requests already holding the old site finish against it.
+    """
+
+    def __init__(self, directory, snapshot_path, open_site, check_interval=5.0):
+        self.directory = directory
+        self.snapshot_path = snapshot_path
+        self.open_site = open_site
+        self.check_interval = check_interval
+        self._current = load_buildings(directory, snapshot_path)
+        self._checked = time.monotonic()
+        self._sites = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._failed = None
+
+    @property
+    def buildings(self):
+        return self._current[1]
+
+    def get(self, slug):
+        """The open Site for ``slug``, or None if no such building is configured."""
+        if time.monotonic() - self._checked >= self.check_interval:
+            self.reload()
+        building = self._current[1].get(slug)
+        if building is None:
+            return None
+        site = self._sites.get(slug)
+        if site is not None and site.building is building:
+            return site
+        with self._lock:
+            site = self._sites.get(slug)
+            if site is None or site.building is not building:
+                old, site = site, self.open_site(building)
+                self._sites[slug] = site
+                if old is not None:
+                    old.close()
+            return site
+
+    def open_sites(self):
+        return list(self._sites.values())
+
+    def reload(self):
+        """Pick up changed data files; keeps the current set if they fail to compile."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # another thread is already on it
+        try:
+            self._checked = time.monotonic()
+            signature = source_signature(self.directory)
+            if signature in (self._current[0], self._failed):
+                return False
+            try:
+                signature, buildings = load_buildings(self.directory, self.snapshot_path)
+            except (OSError, ValueError):
+                # Logged once per broken version of the files, not every check.
+                self._failed = signature
+                log.exception("Failed to reload buildings from %s; keeping the previous set", self.directory)
+                return False
+            # Unchanged buildings keep their old object, so their sites stay open.
+            for slug, old in self._current[1].items():
+                new = buildings.get(slug)
+                if new is not None and new.digest == old.digest:
+                    buildings[slug] = old
+            self._current = (signature, buildings)
+            with self._lock:
+                for slug, site in list(self._sites.items()):
+                    if slug not in buildings:
+                        del self._sites[slug]
+                        site.close()
+            return True
+        finally:
+            self._reload_lock.release()
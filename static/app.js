@@ -0,0 +1,555 @@
+// --- Simple state ---
+// Each building's page has its own path ('/' or '/b/<slug>/'). Requests are
+// relative to it, and per-building keys in storage carry it as a suffix.
+const SITE = location.pathname === '/' ? '' : location.pathname;
+function siteKey(name) { return SITE ? name + '@' + SITE : name; }
+let totalZones = Number(document.body.dataset.totalZones) || 0;
+const visited = new Map();  // zone id -> time it was scanned on this phone
+const zoneList = document.getElementById('zoneList');
+const zoneRows = document.getElementById('zoneRows');
+const floorSelect = document.getElementById('floorSelect');
+let currentZones = [];
+// Bookkeeping so a scan touches one card and two counters, never a DOM query
+const zoneIndex = new Map();    // zone id -> zone, for every loaded floor
+const floorCounts = new Map();  // floor -> { visited, total }
+const cardEls = new Map();      // zone id -> card element, only while in view
+
+// --- Floor data: fetched on demand, neighbours prefetched, kept once loaded ---
+const floorCache = new Map();  // floor -> Promise of its zones
+function loadFloor(floor) {
+  if (!floorCache.has(floor)) {
+    const p = fetch('floors/' + encodeURIComponent(floor))
+      .then(r => { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); })
+      .then(data => indexFloor(floor, data.zones));
+    p.catch(() => floorCache.delete(floor));
+    floorCache.set(floor, p);
+  }
+  return floorCache.get(floor);
+}
+function indexFloor(floor, zones) {
+  let v = 0;
+  for (const z of zones) {
+    zoneIndex.set(z.id, z);
+    if (visited.has(z.id)) v++;
+  }
+  floorCounts.set(floor, { visited: v, total: zones.length });
+  return zones;
+}
+function prefetchAround(floor) {
+  const opts = floorSelect.options;
+  for (let i = 0; i < opts.length; i++) {
+    if (opts[i].value !== floor) continue;
+    for (const o of [opts[i-1], opts[i+1]]) if (o) loadFloor(o.value).catch(()=>{});
+    break;
+  }
+}
+
+// --- Virtualized zone list: only the cards in view (plus a margin) exist ---
+const ROW_H = 92;  // card height + gap
+const OVERSCAN = 6;
+let winFirst = -1, winLast = -1, scrollQueued = false;
+function cardHtml(z, i) {
+  const at = visited.get(z.id);
+  return `<div class="card${at ? ' visited' : ''}" id="zone-${escapeHtml(z.id)}" data-id="${escapeHtml(z.id)}" data-i="${i}" style="top:${i * ROW_H}px">
+      <div class="meta">
+        <div><strong>${escapeHtml(z.location)}</strong> <span style="opacity:.7">• ${escapeHtml(z.floor)}</span></div>
+        <div class="id">NFC: ${escapeHtml(z.id)}</div>
+        <div class="status${at ? ' ok' : ''}" id="status-${escapeHtml(z.id)}">${at ? 'Visited at ' + escapeHtml(at) : 'Not visited'}</div>
+      </div>
+      <div style="display:flex; gap:8px;"><button class="write" onclick="writeNFC('${escapeAttr(z.id)}')">Write to NFC Tag</button></div>
+    </div>`;
+}
+function renderWindow(force=false) {
+  const top = zoneList.scrollTop, h = zoneList.clientHeight;
+  const first = Math.max(0, Math.floor(top / ROW_H) - OVERSCAN);
+  const last = Math.min(currentZones.length, Math.ceil((top + h) / ROW_H) + OVERSCAN);
+  if (!force && first === winFirst && last === winLast) return;
+  winFirst = first; winLast = last;
+  if (force) { zoneRows.textContent = ''; cardEls.clear(); }
+  // Drop the cards that left the window, keep the rest as they are
+  for (const [id, el] of cardEls) {
+    const i = +el.dataset.i;
+    if (i < first || i >= last) { el.remove(); cardEls.delete(id); }
+  }
+  // ...and insert the ones that entered it in a single fragment
+  let html = '';
+  for (let i = first; i < last; i++) {
+    if (!cardEls.has(currentZones[i].id)) html += cardHtml(currentZones[i], i);
+  }
+  if (!html) return;
+  const tpl = document.createElement('template');
+  tpl.innerHTML = html;
+  for (const el of [...tpl.content.children]) cardEls.set(el.dataset.id, el);
+  zoneRows.appendChild(tpl.content);
+}
+zoneList.addEventListener('scroll', () => {
+  if (scrollQueued) return;
+  scrollQueued = true;
+  requestAnimationFrame(() => { scrollQueued = false; renderWindow(); });
+}, { passive: true });
+
+// --- Helpers ---
+function showToast(msg, ok=false) {
+  const el = document.getElementById('toast');
+  el.textContent = msg;
+  el.style.display = 'block';
+  el.style.borderColor = ok ? '#14532d' : '#334155';
+  el.style.color = ok ? '#86efac' : 'white';
+  setTimeout(() => { el.style.display='none'; }, 2200);
+}
+const progressEls = {
+  visited: document.getElementById('visitedCount'),
+  total: document.getElementById('totalCount'),
+  remaining: document.getElementById('remainingCount'),
+  floor: document.getElementById('floorStats'),
+  fill: document.getElementById('progressFill'),
+};
+function setText(el, text) {
+  text = String(text);
+  if (el.textContent !== text) el.textContent = text;
+}
+function updateProgress() {
+  const v = visited.size;
+  const pct = totalZones ? Math.round((v/totalZones)*100) : 0;
+  setText(progressEls.visited, v);
+  setText(progressEls.total, totalZones);
+  setText(progressEls.remaining, totalZones - v);
+  progressEls.fill.style.width = pct + '%';
+
+  const c = floorCounts.get(floorSelect.value) || { visited: 0, total: 0 };
+  setText(progressEls.floor, c.visited + '/' + c.total);
+}
+async function filterByFloor() {
+  const cur = floorSelect.value;
+  try {
+    const zones = await loadFloor(cur);
+    if (floorSelect.value !== cur) return;  // switched again while loading
+    if (zones !== currentZones) { currentZones = zones; zoneList.scrollTop = 0; }
+    document.getElementById('zoneSpacer').style.height = (currentZones.length * ROW_H) + 'px';
+    renderWindow(true);
+    updateProgress();
+  } catch (err) {
+    showToast('❌ Could not load ' + cur, false);
+  }
+  prefetchAround(cur);
+}
+function markVisited(zoneId) {
+  const at = new Date().toLocaleTimeString();
+  if (!visited.has(zoneId)) {
+    const z = zoneIndex.get(zoneId);
+    if (z) floorCounts.get(z.floor).visited++;
+  }
+  visited.set(zoneId, at);
+  const card = cardEls.get(zoneId);
+  if (card) {
+    const status = card.querySelector('.status');
+    card.classList.add('visited');
+    status.textContent = 'Visited at ' + at;
+    status.classList.add('ok');
+  }
+  updateProgress();
+  queueScan({ zoneId, sessionId: patrolId, clientId, client_timestamp: new Date().toISOString() }).then(() => scheduleFlush());
+}
+
+// --- Patrol session (scans count against it until it is closed) ---
+let patrolId = localStorage.getItem(siteKey('patrolId'));
+// Identifies this phone so the server can drop its double taps
+let clientId = localStorage.getItem('clientId');
+if (!clientId) {
+  clientId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+  localStorage.setItem('clientId', clientId);
+}
+function showPatrol() {
+  document.getElementById('patrolBtn').textContent = patrolId ? 'End patrol' : 'Start patrol';
+}
+async function togglePatrol() {
+  try {
+    if (!patrolId) {
+      const guard = (prompt('Guard name') || '').trim();
+      if (!guard) return;
+      const res = await fetch('sessions', {
+        method: 'POST',
+        headers: {'Content-Type':'application/json'},
+        body: JSON.stringify({ guard })
+      });
+      const data = await res.json();
+      if (!data.success) throw new Error(data.error || 'Could not start patrol');
+      patrolId = data.session.id;
+      localStorage.setItem(siteKey('patrolId'), patrolId);
+      showToast('Patrol started.', true);
+    } else {
+      await flushScans();
+      const res = await fetch('sessions/' + encodeURIComponent(patrolId) + '/close', { method: 'POST' });
+      const data = await res.json();
+      patrolId = null;
+      localStorage.removeItem(siteKey('patrolId'));
+      if (data.success) showToast('Patrol closed: ' + data.session.visited_zones + '/' + data.session.total_zones + ' zones.', true);
+    }
+  } catch (err) {
+    showToast('❌ ' + (err.message || 'Patrol request failed'), false);
+  }
+  showPatrol();
+}
+
+// --- Offline scan queue: scans land in IndexedDB and are sent in batches ---
+const SCAN_BATCH = 200;
+let scanDb = null, memQueue = [], flushing = false, flushTimer = null;
+const scanDbReady = new Promise((resolve) => {
+  if (!('indexedDB' in window)) return resolve(null);
+  const req = indexedDB.open(siteKey('nfc-tour'), 1);
+  req.onupgradeneeded = () => req.result.createObjectStore('scans', { autoIncrement: true });
+  req.onsuccess = () => resolve(req.result);
+  req.onerror = () => resolve(null);
+}).then(db => (scanDb = db));
+
+async function queueScan(scan) {
+  await scanDbReady;
+  if (!scanDb) { memQueue.push(scan); return; }
+  await new Promise((resolve) => {
+    const tx = scanDb.transaction('scans', 'readwrite');
+    tx.objectStore('scans').add(scan);
+    tx.oncomplete = tx.onerror = () => resolve();
+  });
+}
+async function peekScans(limit) {
+  await scanDbReady;
+  if (!scanDb) return memQueue.slice(0, limit).map((scan, key) => ({ key, scan }));
+  return new Promise((resolve) => {
+    const out = [];
+    const tx = scanDb.transaction('scans', 'readonly');
+    tx.objectStore('scans').openCursor().onsuccess = (e) => {
+      const cur = e.target.result;
+      if (cur && out.length < limit) { out.push({ key: cur.key, scan: cur.value }); cur.continue(); }
+    };
+    tx.oncomplete = tx.onerror = () => resolve(out);
+  });
+}
+async function dropScans(batch) {
+  if (!scanDb) { memQueue.splice(0, batch.length); return; }
+  // Keys are increasing and the batch was read in key order, so the range
+  // covers exactly the scans that were sent.
+  await new Promise((resolve) => {
+    const tx = scanDb.transaction('scans', 'readwrite');
+    tx.objectStore('scans').delete(IDBKeyRange.bound(batch[0].key, batch[batch.length-1].key));
+    tx.oncomplete = tx.onerror = () => resolve();
+  });
+}
+async function flushScans() {
+  if (flushing || !navigator.onLine) return;
+  flushing = true;
+  try {
+    for (;;) {
+      const batch = await peekScans(SCAN_BATCH);
+      if (!batch.length) break;
+      const res = await fetch('mark_visited_batch', {
+        method: 'POST',
+        headers: {'Content-Type':'application/json'},
+        body: JSON.stringify({ scans: batch.map(b => b.scan) })
+      });
+      if (!res.ok) break;
+      await dropScans(batch);
+    }
+  } catch (err) {
+    // No signal; scans stay queued until we are back online.
+  } finally {
+    flushing = false;
+  }
+}
+function scheduleFlush(delay=300) {
+  clearTimeout(flushTimer);
+  flushTimer = setTimeout(flushScans, delay);
+}
+
+// --- NFC sheet controls ---
+const sheet = document.getElementById('nfcSheet');
+const sheetTitle = document.getElementById('sheetTitle');
+const sheetMsg = document.getElementById('sheetMsg');
+const sheetId = document.getElementById('sheetId');
+function openSheet(title, msg, idText='') {
+  sheetTitle.textContent = title;
+  sheetMsg.innerHTML = msg;
+  sheetId.textContent = idText;
+  sheet.style.display = 'flex';
+}
+function closeSheet(){
+  if (provision) { finishProvisioning(provision, true); return; }
+  sheet.style.display='none';
+}
+
+// --- NFC write with explicit UI + timeout + nicer errors ---
+const NFC_TIMEOUT_MS = 20000;
+
+// One reader for the whole page; Chrome asks for NFC permission only once.
+let nfcReader = null;
+function getReader() { return nfcReader || (nfcReader = new NDEFReader()); }
+
+function nfcAvailable() {
+  if (!('NDEFReader' in window)) {
+    showToast('Web NFC not supported. Use Chrome on Android.', false);
+    return false;
+  }
+  if (!window.isSecureContext) {
+    showToast('This page is not HTTPS (or localhost). NFC blocked.', false);
+    return false;
+  }
+  return true;
+}
+
+// Write an explicit text record (more interoperable than implicit string)
+function nfcMessage(zoneId) { return { records: [{ recordType: 'text', data: zoneId }] }; }
+
+// Map common errors to friendly text
+function nfcErrorMessage(err) {
+  if (err === 'Timeout' || (err && (err.name === 'AbortError'))) return 'Timed out waiting for a tag. Make sure NFC is ON and tap a tag.';
+  if (err && err.name === 'NotAllowedError') return 'NFC permission denied. Tap again and allow when prompted.';
+  if (err && err.name === 'NotSupportedError') return 'Device/Browser does not support NFC or it is disabled.';
+  if (err && err.name === 'SecurityError') return 'Web NFC requires HTTPS (or http://localhost).';
+  if (err && err.name === 'NetworkError') return 'NFC hardware busy/unavailable. Toggle NFC and retry.';
+  if (err && err.message) return err.message;
+  return 'NFC error.';
+}
+
+async function writeNFC(zoneId) {
+  const card = cardEls.get(zoneId);
+  const btn = card && card.querySelector('.write');
+
+  if (!nfcAvailable()) return;
+
+  // visible sheet
+  openSheet('Ready to write', 'Hold the NFC tag against the phone to write<br>Value: <span class="id" id="sheetId"></span>', zoneId);
+
+  let controller;
+  try {
+    if (btn) { btn.disabled = true; btn.textContent = 'Hold tag to phone…'; }
+
+    controller = new AbortController();
+    const t = setTimeout(() => controller.abort('Timeout'), NFC_TIMEOUT_MS);
+
+    await getReader().write(nfcMessage(zoneId), { signal: controller.signal });
+
+    clearTimeout(t);
+
+    // Success UI
+    sheetTitle.textContent = '✅ Written!';
+    sheetMsg.innerHTML = 'Tag successfully written with<br>Value: <span class="id">'+escapeHtml(zoneId)+'</span>';
+    if (navigator.vibrate) navigator.vibrate(80);
+    showToast('✅ Written: ' + zoneId, true);
+    markVisited(zoneId);
+  } catch (err) {
+    const msg = nfcErrorMessage(err);
+
+    sheetTitle.textContent = '❌ Failed';
+    sheetMsg.textContent = msg;
+    showToast('❌ ' + msg, false);
+    console.error('NFC write failed:', err);
+  } finally {
+    if (btn) { btn.disabled = false; btn.textContent = 'Write to NFC Tag'; }
+  }
+}
+
+// --- Floor provisioning: one reader session writes a floor's tags in order ---
+// Writes are kept in localStorage ('provision:<floor>' -> {id: time}) until
+// the server confirms them in one batch at the end.
+let provision = null;
+const PROVISION_PREFIX = siteKey('provision') + ':';
+function provisionKey(floor) { return PROVISION_PREFIX + floor; }
+function pendingProvisioned(floor) {
+  try { return JSON.parse(localStorage.getItem(provisionKey(floor))) || {}; } catch (e) { return {}; }
+}
+
+async function startProvisioning() {
+  if (provision || !nfcAvailable()) return;
+  const floor = floorSelect.value;
+  let zones, confirmed = {};
+  try {
+    zones = await loadFloor(floor);
+    const res = await fetch('provisioning/' + encodeURIComponent(floor));
+    if (res.ok) confirmed = (await res.json()).provisioned || {};
+  } catch (err) {
+    // Offline: go by what this phone has written
+    if (!zones) { showToast('❌ Could not load ' + floor, false); return; }
+  }
+  const p = provision = {
+    floor, zones,
+    done: new Set([...Object.keys(confirmed), ...Object.keys(pendingProvisioned(floor))]),
+    next: -1, staged: null, lastSerial: null, busy: false,
+    controller: new AbortController(),
+  };
+  p.written = zones.filter(z => p.done.has(z.id)).length;
+  stageNext(p);
+  if (!p.staged) { provision = null; await confirmProvisioning(floor); showToast('Every tag on ' + floor + ' is already written.', true); return; }
+
+  openSheet('', '');
+  showProvisioningButtons(true);
+  showProvisionStep(p);
+  const reader = getReader();
+  reader.onreading = (e) => writeStaged(p, e.serialNumber);
+  try {
+    await reader.scan({ signal: p.controller.signal });
+  } catch (err) {
+    showToast('❌ ' + nfcErrorMessage(err), false);
+    finishProvisioning(p, true);
+  }
+}
+function stageNext(p) {
+  // Next unwritten zone, with its record built before the tag arrives
+  let i = p.next + 1;
+  while (i < p.zones.length && p.done.has(p.zones[i].id)) i++;
+  p.next = i;
+  const z = p.zones[i];
+  p.staged = z ? { zone: z, message: nfcMessage(z.id) } : null;
+}
+function showProvisionStep(p, note='') {
+  sheetTitle.textContent = 'Provisioning ' + p.floor + ' (' + p.written + '/' + p.zones.length + ')';
+  if (!p.staged) { sheetMsg.textContent = note; return; }
+  const z = p.staged.zone;
+  sheetMsg.innerHTML = (note ? escapeHtml(note) + '<br>' : '') +
+    'Hold the tag for <strong>' + escapeHtml(z.location) + '</strong> to the phone<br>Value: <span class="id">' + escapeHtml(z.id) + '</span>';
+}
+function showProvisioningButtons(on) {
+  document.getElementById('sheetSkip').style.display = on ? '' : 'none';
+  document.getElementById('sheetClose').textContent = on ? 'Stop' : 'Close';
+  document.getElementById('sheetHint').style.display = on ? 'none' : '';
+}
+async function writeStaged(p, serial) {
+  if (p !== provision || p.busy || !p.staged) return;
+  // The tag just written usually stays against the phone; don't give it the next id too.
+  if (serial && serial === p.lastSerial) return;
+  p.busy = true;
+  const z = p.staged.zone;
+  try {
+    await getReader().write(p.staged.message, { signal: p.controller.signal });
+    p.lastSerial = serial;
+    p.done.add(z.id);
+    p.written++;
+    const pending = pendingProvisioned(p.floor);
+    pending[z.id] = new Date().toISOString();
+    localStorage.setItem(provisionKey(p.floor), JSON.stringify(pending));
+    if (navigator.vibrate) navigator.vibrate(80);
+    stageNext(p);
+    if (p.staged) showProvisionStep(p, '✅ Written: ' + z.id);
+    else finishProvisioning(p);
+  } catch (err) {
+    if (!p.controller.signal.aborted) showProvisionStep(p, '❌ ' + nfcErrorMessage(err) + ' Tap the tag again.');
+  } finally {
+    p.busy = false;
+  }
+}
+function skipProvisioning() {
+  const p = provision;
+  if (!p || p.busy) return;
+  stageNext(p);
+  if (p.staged) showProvisionStep(p, 'Skipped.');
+  else finishProvisioning(p);
+}
+async function finishProvisioning(p, stopped=false) {
+  if (p !== provision) return;
+  provision = null;
+  p.controller.abort();
+  getReader().onreading = null;
+  showProvisioningButtons(false);
+  sheetTitle.textContent = stopped ? 'Provisioning stopped' : '✅ ' + p.floor + ' done';
+  sheetMsg.textContent = p.written + ' of ' + p.zones.length + ' tags written. Confirming…';
+  const ok = await confirmProvisioning(p.floor);
+  sheetMsg.textContent = p.written + ' of ' + p.zones.length + ' tags written' +
+    (ok ? '.' : '; the server will be told once we are back online.');
+}
+async function confirmProvisioning(floor) {
+  const pending = pendingProvisioned(floor);
+  const ids = Object.keys(pending);
+  if (!ids.length) return true;
+  try {
+    const res = await fetch('provisioning/' + encodeURIComponent(floor), {
+      method: 'POST',
+      headers: {'Content-Type':'application/json'},
+      body: JSON.stringify({ clientId, tags: ids.map(id => ({ id, timestamp: pending[id] })) })
+    });
+    const data = await res.json();
+    if (!data.success) return false;
+  } catch (err) {
+    return false;
+  }
+  // Drop only what was sent; keep anything written meanwhile
+  const left = pendingProvisioned(floor);
+  for (const id of ids) delete left[id];
+  if (Object.keys(left).length) localStorage.setItem(provisionKey(floor), JSON.stringify(left));
+  else localStorage.removeItem(provisionKey(floor));
+  return true;
+}
+function confirmAllProvisioning() {
+  for (let i = localStorage.length - 1; i >= 0; i--) {
+    const key = localStorage.key(i);
+    if (key && key.startsWith(PROVISION_PREFIX)) confirmProvisioning(key.slice(PROVISION_PREFIX.length));
+  }
+}
+
+// --- Add custom tag ---
+async function addCustom(e) {
+  e.preventDefault();
+  const id = document.getElementById('tagId').value.trim();
+  const location = document.getElementById('tagLocation').value.trim();
+  const floor = document.getElementById('tagFloor').value;
+
+  if (!/^[0-9]{8}$/.test(id)) {
+    showToast('Tag ID must be exactly 8 digits.', false);
+    return false;
+  }
+
+  try {
+    const res = await fetch('add_custom_tag', {
+      method: 'POST',
+      headers: {'Content-Type':'application/json'},
+      body: JSON.stringify({ id, location, floor })
+    });
+    const data = await res.json();
+    if (!data.success) throw new Error(data.error || 'Failed to add tag');
+
+    // Keep the cached floor in step instead of refetching it
+    totalZones++;
+    if (floorCache.has(floor) && !zoneIndex.has(id)) {
+      const zones = await floorCache.get(floor);
+      const z = { id, location, floor, visited: false };
+      zones.push(z);
+      zoneIndex.set(id, z);
+      floorCounts.get(floor).total++;
+    }
+
+    document.getElementById('tagId').value = '';
+    document.getElementById('tagLocation').value = '';
+    showToast('Custom tag added.', true);
+    if (floor === floorSelect.value) {
+      document.getElementById('zoneSpacer').style.height = (currentZones.length * ROW_H) + 'px';
+      winLast = -1;  // let renderWindow() add the new card if it is in view
+      renderWindow();
+    }
+    updateProgress();
+  } catch (err) {
+    console.error(err);
+    showToast('❌ ' + (err.message || 'Add failed'), false);
+  }
+  return false;
+}
+
+function escapeHtml(s){ return s.replace(/[&<>"']/g, m=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#039;'}[m])); }
+function escapeAttr(s){ return s.replace(/['"\\]/g, '\\$&'); }
+
+// --- Init ---
+document.addEventListener('DOMContentLoaded', () => {
+  const httpsOk = (location.protocol === 'https:') || (location.hostname === 'localhost' || location.hostname === '127.0.0.1');
+  if (!httpsOk) document.getElementById('envHint').textContent = '⚠️ Use HTTPS (or http://localhost) for NFC';
+
+  const fs = document.getElementById('floorSelect');
+  fs.value = fs.options[0].value;
+  fs.addEventListener('change', filterByFloor);
+  filterByFloor();
+  showPatrol();
+
+  // Keep the shell and visited floors available offline
+  if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js').catch(()=>{});
+
+  // Send anything left over from an earlier offline patrol
+  window.addEventListener('online', () => { scheduleFlush(0); confirmAllProvisioning(); });
+  confirmAllProvisioning();
+  setInterval(flushScans, 30000);
+  scheduleFlush(0);
+});
@@ -0,0 +1,461 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sessions import SessionManager
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zones (
+    id TEXT PRIMARY KEY,
+    floor TEXT NOT NULL,
+    location TEXT NOT NULL,
+    custom INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS visits (
+    zone_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    zone_id TEXT NOT NULL,
+    floor TEXT,
+    location TEXT,
+    timestamp TEXT,
+    session TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    guard TEXT NOT NULL,
+    started TEXT NOT NULL,
+    closed TEXT
+);
+CREATE TABLE IF NOT EXISTS session_scans (
+    session_id TEXT NOT NULL,
+    zone_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (session_id, zone_id)
+);
+CREATE TABLE IF NOT EXISTS provisioned (
+    zone_id TEXT PRIMARY KEY,
+    floor TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    client TEXT
+);
+"""
+
+# Columns a change row carries, in order. Session rows leave zone_id empty
+# and put the guard's name in location.
+CHANGE_COLUMNS = "version, kind, zone_id, floor, location, timestamp, session"
+
+# Changes older than this many versions are pruned; a worker that falls
+# further behind reloads from the zones/visits tables instead.
+CHANGE_RETENTION = 50000
+
+
+class ZoneStore:
+    """SQLite (WAL) persistence behind a ZoneRegistry.
+
+    The registry stays the in-process read cache. Scans are applied to it
+    immediately and written behind in group commits every ``flush_interval``
+    seconds; custom tags are committed synchronously so the duplicate check
+    holds across workers. Every write also lands in the ``changes`` table,
+    and ``sync()`` replays rows other workers committed since we last looked.
+    """
+
+    def __init__(self, path, registry, sessions=None, visit_log=None, flush_interval=0.05):
+        self.path = path
+        self.registry = registry
+        self.visit_log = visit_log
+        self.sessions = sessions if sessions is not None else SessionManager(registry)
+        self.flush_interval = flush_interval
+        self.version = 0
+        self._pid = None
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # Visit-log records whose append failed; retried on the next flush.
+        self._log_backlog = []
+        self._closed = False
+        self._read_lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._data_version = None
+        # Called with the change rows each sync() applies, or None when the
+        # store had to reload from scratch.
+        self.listeners = []
+        self._open()
+        with self._write_lock:
+            self._writer.executescript(SCHEMA)
+            columns = [r[1] for r in self._writer.execute("PRAGMA table_info(changes)")]
+            if "session" not in columns:
+                self._writer.execute("ALTER TABLE changes ADD COLUMN session TEXT")
+            # The building's data file owns the configured zones; older
+            # databases kept a copy, which would bring removed zones back.
+            self._writer.execute("DELETE FROM zones WHERE custom = 0")
+        self.reload()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self):
+        # Connections (and the flusher thread) must not be shared across a
+        # gunicorn fork, so reopen them whenever we find ourselves in a new process.
+        self._pid = os.getpid()
+        self._reader = self._connect()
+        self._writer = self._connect()
+        self._flusher = None
+        self._data_version = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._open()
+
+    def reload(self):
+        """Load custom tags, visits and patrols from the tables into the registry."""
+        self._check_pid()
+        with self._read_lock:
+            cur = self._reader
+            cur.execute("BEGIN")
+            try:
+                version = cur.execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+                zones = cur.execute("SELECT id, floor, location FROM zones WHERE custom = 1 ORDER BY rowid").fetchall()
+                visits = cur.execute("SELECT zone_id, timestamp FROM visits").fetchall()
+                # Active patrols plus the most recent closed ones the history keeps.
+                recent = (
+                    "SELECT id FROM sessions WHERE closed IS NULL UNION ALL"
+                    " SELECT id FROM (SELECT id FROM sessions WHERE closed IS NOT NULL ORDER BY closed DESC LIMIT ?)"
+                )
+                history = self.sessions.history_size
+                sessions = cur.execute(
+                    "SELECT id, guard, started, closed FROM sessions WHERE id IN (%s) ORDER BY closed" % recent,
+                    (history,),
+                ).fetchall()
+                session_scans = cur.execute(
+                    "SELECT session_id, zone_id, timestamp FROM session_scans WHERE session_id IN (%s)" % recent,
+                    (history,),
+                ).fetchall()
+            finally:
+                cur.execute("COMMIT")
+            for zone_id, floor, location in zones:
+                if zone_id not in self.registry:
+                    self.registry.add(floor, zone_id, location, custom=True)
+            self.registry.mark_visited_many(visits)
+            for session_id, guard, started, closed in sessions:
+                self.sessions.start(session_id, guard, started)
+                if closed is not None:
+                    self.sessions.close(session_id, closed)
+            for session_id, zone_id, timestamp in session_scans:
+                self.sessions.scan(session_id, zone_id, timestamp)
+            self.version = version
+
+    def sync(self):
+        """Apply changes committed by other workers; cheap when nothing changed."""
+        self._check_pid()
+        with self._read_lock:
+            data_version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            # Under the write lock too: add_zones() registers tags there, and
+            # both must add them in commit order.
+            with self._write_lock:
+                rows = self.changes_since(self.version)
+                if rows is None:
+                    # We fell behind the retained change window.
+                    self.reload()
+                else:
+                    for version, kind, zone_id, floor, location, timestamp, session in rows:
+                        if kind == "visit":
+                            self.registry.mark_visited(zone_id, timestamp)
+                            if session:
+                                self.sessions.scan(session, zone_id, timestamp)
+                        elif kind == "tag" and zone_id not in self.registry:
+                            self.registry.add(floor, zone_id, location, custom=True)
+                        elif kind == "session_start":
+                            self.sessions.start(session, location, timestamp)
+                        elif kind == "session_close":
+                            self.sessions.close(session, timestamp)
+                        self.version = version
+            if rows == []:
+                return
+            for listener in self.listeners:
+                listener(rows)
+
+    def changes_since(self, version):
+        """Change rows after ``version``, or None if some were already pruned."""
+        self._check_pid()
+        with self._read_lock:
+            cur = self._reader
+            cur.execute("BEGIN")
+            try:
+                oldest = cur.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+                if oldest is not None and oldest > version + 1:
+                    return None
+                return cur.execute(
+                    "SELECT %s FROM changes WHERE version > ? ORDER BY version" % CHANGE_COLUMNS,
+                    (version,),
+                ).fetchall()
+            finally:
+                cur.execute("COMMIT")
+
+    def session_guards(self, session_ids):
+        """``{session_id: guard}`` for any patrol, however long ago it closed."""
+        self._check_pid()
+        ids = list(session_ids)
+        guards = {}
+        with self._read_lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                guards.update(self._reader.execute(
+                    "SELECT id, guard FROM sessions WHERE id IN (%s)" % ",".join("?" * len(chunk)), chunk
+                ).fetchall())
+        return guards
+
+    def record_visits(self, scans, session_id=None):
+        """Apply ``(zone_id, timestamp)`` scans now and queue them for the next group commit."""
+        self._check_pid()
+        newly = self.registry.mark_visited_many(scans)
+        rows = []
+        for zone_id, ts in scans:
+            # Scans the patrol refuses (e.g. it closed meanwhile) are kept as plain visits.
+            session = session_id if session_id and self.sessions.scan(session_id, zone_id, ts) is not None else None
+            rows.append(("visit", zone_id, None, None, ts, session))
+        with self._pending_lock:
+            self._pending.extend(rows)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="zone-store-flusher", daemon=True)
+                self._flusher.start()
+        self._wake.set()
+        return newly
+
+    def add_zone(self, floor, zone_id, location):
+        """Commit a custom tag; returns None if the id exists in any worker."""
+        if not self.add_zones([(floor, zone_id, location)]):
+            return None
+        return self.registry.get(zone_id)
+
+    def add_zones(self, tags):
+        """Commit ``(floor, zone_id, location)`` custom tags in one transaction.
+
+        Returns the ids that were added; the rest already existed, here, in
+        another worker or earlier in ``tags``.
+        """
+        self._check_pid()
+        added = []
+        with self._write_lock:
+            cur = self._writer
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                self._register_committed_tags(cur)
+                for floor, zone_id, location in tags:
+                    if zone_id in self.registry:
+                        continue
+                    inserted = cur.execute(
+                        "INSERT OR IGNORE INTO zones (id, floor, location, custom) VALUES (?, ?, ?, 1)",
+                        (zone_id, floor, location),
+                    ).rowcount
+                    if inserted:
+                        cur.execute(
+                            "INSERT INTO changes (kind, zone_id, floor, location) VALUES ('tag', ?, ?, ?)",
+                            (zone_id, floor, location),
+                        )
+                        added.append((floor, zone_id, location))
+                cur.execute("COMMIT")
+            except sqlite3.Error:
+                if cur.in_transaction:
+                    cur.execute("ROLLBACK")
+                raise
+            # Still under the write lock, so zones enter the registry in commit
+            # order; a concurrent sync() may already have added some of them.
+            for floor, zone_id, location in added:
+                self.registry.add(floor, zone_id, location, custom=True)
+        return [zone_id for _, zone_id, _ in added]
+
+    def _register_committed_tags(self, cur):
+        """Add tags other workers committed ahead of us, in commit order.
+
+        Called inside the writer's transaction, so nothing can commit in
+        between: ours then land after them in every worker's registry and
+        the bit positions in ``bitset()`` agree across workers. The rows stay
+        unapplied otherwise; the next sync() still replays them.
+        """
+        oldest = cur.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+        if oldest is not None and oldest > self.version + 1:
+            tags = cur.execute("SELECT floor, id, location FROM zones WHERE custom = 1 ORDER BY rowid")
+        else:
+            tags = cur.execute(
+                "SELECT floor, zone_id, location FROM changes WHERE kind = 'tag' AND version > ? ORDER BY version",
+                (self.version,),
+            )
+        for floor, zone_id, location in tags.fetchall():
+            if zone_id not in self.registry:
+                self.registry.add(floor, zone_id, location, custom=True)
+
+    def record_provisioned(self, tags, client=None):
+        """Commit ``(zone_id, timestamp)`` tag writes; a rewritten tag keeps its latest time."""
+        self._check_pid()
+        rows = []
+        for zone_id, ts in tags:
+            zone = self.registry.get(zone_id)
+            if zone is not None:
+                rows.append((zone_id, zone["floor"], ts, client))
+        with self._write_lock:
+            cur = self._writer
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany(
+                    "INSERT INTO provisioned (zone_id, floor, timestamp, client) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(zone_id) DO UPDATE SET timestamp = excluded.timestamp, client = excluded.client",
+                    rows,
+                )
+                cur.execute("COMMIT")
+            except sqlite3.Error:
+                if cur.in_transaction:
+                    cur.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def provisioned(self, floor):
+        """``{zone_id: timestamp}`` of the tags written on ``floor``."""
+        self._check_pid()
+        with self._read_lock:
+            return dict(self._reader.execute(
+                "SELECT zone_id, timestamp FROM provisioned WHERE floor = ?", (floor,)
+            ).fetchall())
+
+    def start_session(self, guard, timestamp):
+        self._check_pid()
+        session_id = self.sessions.new_id()
+        with self._write_lock:
+            cur = self._writer
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(
+                "INSERT INTO sessions (id, guard, started) VALUES (?, ?, ?)",
+                (session_id, guard, timestamp),
+            )
+            cur.execute(
+                "INSERT INTO changes (kind, zone_id, location, timestamp, session)"
+                " VALUES ('session_start', '', ?, ?, ?)",
+                (guard, timestamp, session_id),
+            )
+            cur.execute("COMMIT")
+        return self.sessions.start(session_id, guard, timestamp)
+
+    def close_session(self, session_id, timestamp):
+        """Close an active patrol; returns None if no such session is open."""
+        self._check_pid()
+        # Scans still waiting for a group commit belong before the close.
+        self.flush()
+        with self._write_lock:
+            cur = self._writer
+            cur.execute("BEGIN IMMEDIATE")
+            updated = cur.execute(
+                "UPDATE sessions SET closed = ? WHERE id = ? AND closed IS NULL",
+                (timestamp, session_id),
+            ).rowcount
+            if not updated:
+                cur.execute("ROLLBACK")
+                return None
+            cur.execute(
+                "INSERT INTO changes (kind, zone_id, timestamp, session) VALUES ('session_close', '', ?, ?)",
+                (timestamp, session_id),
+            )
+            cur.execute("COMMIT")
+        return self.sessions.close(session_id, timestamp)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Let a burst of scans pile up so they share one commit.
+            time.sleep(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                log.exception("Failed to flush scans to %s", self.path)
+            with self._pending_lock:
+                if self._closed and not self._pending:
+                    self._flusher = None
+                    return
+
+    def close(self):
+        """Flush and let the flusher thread exit once idle.
+
+        Requests still holding the store can write to it; those scans start
+        a flusher again, which commits them and exits.
+        """
+        self._closed = True
+        atexit.unregister(self.flush)
+        self.flush()
+        self._wake.set()
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self._commit(pending)
+        if self.visit_log is not None:
+            self._append_log(pending)
+
+    def _commit(self, pending):
+        with self._write_lock:
+            cur = self._writer
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                cur.executemany(
+                    "INSERT INTO changes (kind, zone_id, floor, location, timestamp, session)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    pending,
+                )
+                cur.executemany(
+                    "INSERT INTO visits (zone_id, timestamp) VALUES (?, ?)"
+                    " ON CONFLICT(zone_id) DO UPDATE SET timestamp = excluded.timestamp",
+                    [(zone_id, ts) for kind, zone_id, _, _, ts, _ in pending if kind == "visit"],
+                )
+                cur.executemany(
+                    "INSERT OR IGNORE INTO session_scans (session_id, zone_id, timestamp) VALUES (?, ?, ?)",
+                    [(session, zone_id, ts) for kind, zone_id, _, _, ts, session in pending if session],
+                )
+                last = cur.execute("SELECT MAX(version) FROM changes").fetchone()[0]
+                if last > CHANGE_RETENTION:
+                    cur.execute("DELETE FROM changes WHERE version <= ?", (last - CHANGE_RETENTION,))
+                cur.execute("COMMIT")
+            except sqlite3.Error:
+                if cur.in_transaction:
+                    cur.execute("ROLLBACK")
+                # Keep the scans for the next attempt rather than dropping them.
+                with self._pending_lock:
+                    self._pending[:0] = pending
+                raise
+
+    def _append_log(self, pending):
+        with self._pending_lock:
+            records, self._log_backlog = self._log_backlog, []
+        for kind, zone_id, _, _, ts, session in pending:
+            if kind == "visit":
+                zone = self.registry.get(zone_id)
+                records.append({
+                    "ts": ts,
+                    "zone_id": zone_id,
+                    "floor": zone["floor"] if zone else None,
+                    "session": session,
+                })
+        if not records:
+            return
+        try:
+            self.visit_log.append(records)
+        except OSError:
+            # The audit trail must not lose scans: keep them for the next
+            # flush (a partly written batch may then repeat a few lines).
+            log.exception("Failed to append %d scans to the visit log; will retry", len(records))
+            with self._pending_lock:
+                self._log_backlog[:0] = records
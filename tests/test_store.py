@@ -0,0 +1,126 @@
+"""Two ZoneStores on one database, standing in for two gunicorn workers."""
+import sqlite3
+
+import pytest
+
+import store as store_module
+from registry import ZoneRegistry
+from store import ZoneStore
+
+FLOORS = {
+    "Floor 1": [{"id": "z1", "location": "Lobby"}, {"id": "z2", "location": "Stairs"}],
+    "Floor 2": [{"id": "z3", "location": "Roof"}],
+}
+
+
+def open_store(path, floors=FLOORS):
+    registry = ZoneRegistry({floor: [dict(z) for z in zones] for floor, zones in floors.items()})
+    # Flushed by hand, so the background flusher never commits first.
+    return ZoneStore(str(path), registry, flush_interval=3600)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    a, b = open_store(tmp_path / "tour.db"), open_store(tmp_path / "tour.db")
+    yield a, b
+    a.close()
+    b.close()
+
+
+class FailingWriter:
+    """Wraps a connection so the next ``executemany`` raises, as a locked database would."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.fail = True
+
+    def executemany(self, *args):
+        if self.fail:
+            self.fail = False
+            raise sqlite3.OperationalError("database is locked")
+        return self._conn.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_sync_replays_other_workers_changes(workers):
+    a, b = workers
+    seen = []
+    b.listeners.append(seen.append)
+    a.record_visits([("z1", "2026-10-18T08:00:00")])
+    a.flush()
+    a.add_zone("Floor 2", "t1", "Plant room")
+    b.sync()
+    assert b.registry.get("z1")["visited"]
+    assert b.registry.get("t1")["location"] == "Plant room"
+    assert b.registry.floor_counts("Floor 2") == (0, 2)
+    assert [row[1] for row in seen[0]] == ["visit", "tag"]
+    # A worker's own changes come back through its sync() too, harmlessly.
+    a.sync()
+    assert a.version == b.version
+    assert a.registry.total == b.registry.total == 4
+
+
+def test_sync_reloads_after_falling_behind_retention(workers, monkeypatch):
+    a, b = workers
+    monkeypatch.setattr(store_module, "CHANGE_RETENTION", 2)
+    seen = []
+    b.listeners.append(seen.append)
+    for i, zone_id in enumerate(["z1", "z2", "z3", "z1"]):
+        a.record_visits([(zone_id, "2026-10-18T08:0%d:00" % i)])
+        a.flush()
+    assert b.changes_since(b.version) is None
+    b.sync()
+    assert seen == [None]
+    assert [b.registry.get(z)["visited"] for z in ("z1", "z2", "z3")] == [True, True, True]
+    assert b.changes_since(b.version) == []
+
+
+def test_failed_group_commit_is_retried(workers):
+    a, b = workers
+    a.record_visits([("z2", "2026-10-18T08:00:00")])
+    real, a._writer = a._writer, FailingWriter(a._writer)
+    with pytest.raises(sqlite3.OperationalError):
+        a.flush()
+    assert not a._writer._conn.in_transaction
+    a._writer = real
+    a.flush()
+    b.sync()
+    assert b.registry.get("z2")["visited"]
+    assert b.registry.visited_count == 1
+
+
+def test_duplicate_custom_tag_rejected_across_workers(workers):
+    a, b = workers
+    assert a.add_zone("Floor 1", "t1", "Boiler") is not None
+    assert b.add_zone("Floor 2", "t1", "Elsewhere") is None
+    assert b.add_zones([("Floor 1", "z1", "Lobby again"), ("Floor 1", "t2", "Kitchen")]) == ["t2"]
+    b.sync()
+    assert b.registry.get("t1")["location"] == "Boiler"
+    a.sync()
+    assert [z["id"] for _, z in a.registry.iter_custom()] == ["t1", "t2"]
+    assert {floor: [z["id"] for z in zones] for floor, zones in a.registry.custom.items()} == {"Floor 1": ["t1", "t2"]}
+
+
+def test_workers_agree_on_zone_order(workers):
+    a, b = workers
+    b.add_zone("Floor 1", "t0", "Boiler")
+    a.add_zone("Floor 1", "t1", "Kitchen")
+    b.add_zones([("Floor 2", "t2", "Lift")])
+    a.sync()
+    b.sync()
+    assert a.registry.order == b.registry.order == ["z1", "z2", "z3", "t0", "t1", "t2"]
+    a.record_visits([("t1", "2026-10-18T08:00:00")])
+    a.flush()
+    b.sync()
+    assert a.registry.bitset() == b.registry.bitset()
+
+
+def test_removed_configured_zone_stays_removed(tmp_path):
+    s = open_store(tmp_path / "tour.db")
+    s.add_zone("Floor 1", "t1", "Boiler")
+    s.close()
+    s = open_store(tmp_path / "tour.db", {"Floor 1": [{"id": "z1", "location": "Lobby"}]})
+    assert s.registry.order == ["z1", "t1"]
+    s.close()